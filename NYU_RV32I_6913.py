@@ -1,12 +1,62 @@
 import os
 import argparse
+from collections import namedtuple
 
 MemSize = 1000  # Memory size, though still 32-bit addressable
 
+DEFAULT_INPUT = "Sample_Testcases_SS/input/testcase1"  # under ioDir, used when no inputDir is given
+
+HALT_INSTR = 0xFFFFFFFF
+
+# One retired instruction: PC, raw word, mnemonic, register write and memory accesses.
+# rd/rdValue are None when no register is written, memRead/memWrite are (addr, value) or None.
+RetireRecord = namedtuple("RetireRecord", ["cycle", "pc", "instr", "op", "rd", "rdValue", "memRead", "memWrite"])
+
+Decoded = namedtuple("Decoded", ["op", "rd", "rs1", "rs2", "imm"])
+
+R_OPS = {(0, 0x00): "add", (0, 0x20): "sub", (4, 0x00): "xor", (6, 0x00): "or", (7, 0x00): "and"}
+I_OPS = {0: "addi", 4: "xori", 6: "ori", 7: "andi"}
+B_OPS = {0: "beq", 1: "bne"}
+
+
+def signExtend(value, bits):
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value & (1 << (bits - 1)) else value
+
+
+def decodeInstr(instr):
+    # Decode a 32-bit instruction word of the supported RV32I subset
+    opcode = instr & 0x7F
+    rd = (instr >> 7) & 0x1F
+    funct3 = (instr >> 12) & 0x7
+    rs1 = (instr >> 15) & 0x1F
+    rs2 = (instr >> 20) & 0x1F
+
+    if instr == HALT_INSTR:
+        return Decoded("halt", 0, 0, 0, 0)
+    elif opcode == 0x33:
+        return Decoded(R_OPS.get((funct3, instr >> 25)), rd, rs1, rs2, 0)
+    elif opcode == 0x13:
+        return Decoded(I_OPS.get(funct3), rd, rs1, 0, signExtend(instr >> 20, 12))
+    elif opcode == 0x03:  # all loads are word loads in this subset
+        return Decoded("lw", rd, rs1, 0, signExtend(instr >> 20, 12))
+    elif opcode == 0x23:
+        imm = ((instr >> 20) & 0xFE0) | ((instr >> 7) & 0x1F)
+        return Decoded("sw", 0, rs1, rs2, signExtend(imm, 12))
+    elif opcode == 0x63:
+        imm = ((instr >> 19) & 0x1000) | ((instr << 4) & 0x800) | ((instr >> 20) & 0x7E0) | ((instr >> 7) & 0x1E)
+        return Decoded(B_OPS.get(funct3), 0, rs1, rs2, signExtend(imm, 13))
+    elif opcode == 0x6F:
+        imm = ((instr >> 11) & 0x100000) | (instr & 0xFF000) | ((instr >> 9) & 0x800) | ((instr >> 20) & 0x7FE)
+        return Decoded("jal", rd, 0, 0, signExtend(imm, 21))
+    return Decoded(None, rd, rs1, rs2, 0)
+
 class InsMem(object):
-    def __init__(self, name, ioDir):
+    def __init__(self, name, ioDir, inputDir=None):
         self.id = name
-        with open(ioDir + "/Sample_Testcases_SS/input/testcase1/imem.txt") as im:
+        self.latency = 1  # cycles per fetch
+        inputDir = inputDir or os.path.join(ioDir, DEFAULT_INPUT)
+        with open(os.path.join(inputDir, "imem.txt")) as im:
             self.IMem = [data.strip() for data in im.readlines()]
 
     def readInstr(self, ReadAddress):
@@ -19,11 +69,27 @@ class InsMem(object):
         
 
 class DataMem(object):
-    def __init__(self, name, ioDir):
+    def __init__(self, name, ioDir, inputDir=None):
         self.id = name
         self.ioDir = ioDir
-        with open(ioDir + "/Sample_Testcases_SS/input/testcase1/dmem.txt") as dm:
+        self.latency = 1  # cycles per load/store
+        inputDir = inputDir or os.path.join(ioDir, DEFAULT_INPUT)
+        with open(os.path.join(inputDir, "dmem.txt")) as dm:
             self.DMem = [data.strip() for data in dm.readlines()]
+        self.dirty = set()  # word-aligned byte indices written since the last dump or delta
+        self.deltaCount = 0
+
+    def copy(self):
+        # Independent memory with the same contents, name and latency; hooks installed on this
+        # instance are not carried over
+        other = object.__new__(DataMem)
+        other.id = self.id
+        other.ioDir = self.ioDir
+        other.latency = self.latency
+        other.DMem = list(self.DMem)
+        other.dirty = set(self.dirty)
+        other.deltaCount = self.deltaCount
+        return other
 
     def ensure_memory_size(self, min_size):
         if min_size > len(self.DMem):
@@ -39,6 +105,7 @@ class DataMem(object):
         index = Address // 4 * 4  
         self.ensure_memory_size(index + 4)  # Ensure memory is large enough
         data_word = format(WriteData, '032b')
+        self.dirty.add(index)
         self.DMem[index] = data_word[0:8]
         self.DMem[index + 1] = data_word[8:16]
         self.DMem[index + 2] = data_word[16:24]
@@ -47,7 +114,34 @@ class DataMem(object):
     def outputDataMem(self):
         resPath = self.ioDir + "/" + self.id + "_DMEMResult.txt"
         with open(resPath, "w") as rp:
-            rp.writelines([str(data) + "\n" for data in self.DMem])
+            if self.DMem:
+                rp.write("\n".join(self.DMem) + "\n")
+        self.dirty.clear()
+
+    def takeDelta(self):
+        # (memory length, {word index: [4 bytes]}) for the words written since the last dump or delta
+        delta = dict((index, self.DMem[index:index + 4]) for index in sorted(self.dirty))
+        self.dirty.clear()
+        return len(self.DMem), delta
+
+    def applyDelta(self, length, delta):
+        self.ensure_memory_size(length)
+        del self.DMem[length:]
+        for index, data in delta.items():
+            self.DMem[index:index + 4] = data
+
+    def outputDataMemDelta(self, label):
+        # Append only the words written since the last dump or delta; replaying the blocks with
+        # applyDelta over the initial image reproduces the memory at each label
+        length, delta = self.takeDelta()
+        lines = ["-" * 70 + "\n", "DMEM delta " + str(label) + " length " + str(length) + "\n"]
+        for index, data in delta.items():
+            lines.append(str(index) + " " + " ".join(data) + "\n")
+        resPath = self.ioDir + "/" + self.id + "_DMEMDelta.txt"
+        perm = "w" if self.deltaCount == 0 else "a"
+        self.deltaCount += 1
+        with open(resPath, perm) as rp:
+            rp.writelines(lines)
 
 
 class RegisterFile(object):
@@ -65,9 +159,13 @@ class RegisterFile(object):
         if 1 <= Reg_addr < 32:  # Register x0 must always remain 0
             self.Registers[Reg_addr] = Wrt_reg_data
     
-    def outputRF(self, cycle):
-        op = ["-" * 70 + "\n", "State of RF after executing cycle:" + str(cycle) + "\n"]
-        op.extend([f"{val & 0xFFFFFFFF:032b}\n" for val in self.Registers])  # Mask and format each register value as a 32-bit binary string
+    def outputRF(self, cycle, repeat=1):
+        # repeat > 1 dumps the same registers for cycles cycle .. cycle + repeat - 1 in one write
+        regs = [f"{val & 0xFFFFFFFF:032b}\n" for val in self.Registers]  # Mask and format each register value as a 32-bit binary string
+        op = []
+        for c in range(cycle, cycle + repeat):
+            op.extend(["-" * 70 + "\n", "State of RF after executing cycle:" + str(c) + "\n"])
+            op.extend(regs)
         perm = "w" if cycle == 0 else "a"
         with open(self.outputFile, perm) as file:
             file.writelines(op)
@@ -83,6 +181,12 @@ class State(object):
                    "wrt_mem": 0, "wrt_enable": 0}
         self.WB = {"nop": False, "Wrt_data": 0, "Rs": 0, "Rt": 0, "Wrt_reg_addr": 0, "wrt_enable": 0}
 
+    def copy(self):
+        other = State()
+        other.IF, other.ID, other.EX = dict(self.IF), dict(self.ID), dict(self.EX)
+        other.MEM, other.WB = dict(self.MEM), dict(self.WB)
+        return other
+
 class Core(object):
     def __init__(self, ioDir, imem, dmem):
         self.myRF = RegisterFile(ioDir)
@@ -94,6 +198,51 @@ class Core(object):
         self.ext_imem = imem
         self.ext_dmem = dmem
         self.instructionCount = 0
+        self.stallCycles = 0  # remaining cycles in which the core waits and no state changes
+        self.traceEnabled = True  # write RF and state dumps every cycle
+        self.retireListeners = []  # callables receiving a RetireRecord per retired instruction
+
+    def saveState(self):
+        # Control state needed to resume from the current cycle; RF and memories are not included
+        state = self.state.copy()
+        nextState = state if self.nextState is self.state else self.nextState.copy()
+        return (self.cycle, self.halted, self.instructionCount, self.stallCycles, state, nextState)
+
+    def restoreState(self, saved):
+        self.cycle, self.halted, self.instructionCount, self.stallCycles, state, nextState = saved
+        self.state = state.copy()
+        self.nextState = self.state if nextState is state else nextState.copy()
+
+    def nextEventCycle(self):
+        # First cycle in which the core does more than wait out a stall
+        return self.cycle + self.stallCycles
+
+    def skipCycles(self, n):
+        # Advance through n stall cycles at once; the trace is identical to n single steps
+        if self.traceEnabled:
+            self.myRF.outputRF(self.cycle, n)
+            self.printState(self.nextState, self.cycle, n)
+        self.stallCycles -= n
+        self.cycle += n
+
+    def metrics(self):
+        total_cycles = self.cycle
+        total_instructions = self.instructionCount
+        average_cpi = total_cycles / total_instructions if total_instructions > 0 else 0
+        ipc = total_instructions / total_cycles if total_cycles > 0 else 0
+        return total_cycles, total_instructions, average_cpi, ipc
+
+    def report_performance_metrics(self):
+        total_cycles, total_instructions, average_cpi, ipc = self.metrics()
+
+        print(f"Total Execution Cycles: {total_cycles}")
+        print(f"Total Instructions Executed: {total_instructions}")
+        print(f"Average CPI: {average_cpi:.2f}")
+        print(f"Instructions Per Cycle (IPC): {ipc:.2f}")
+
+    def notifyRetire(self, record):
+        for listener in self.retireListeners:
+            listener(record)
 
 
 class SingleStageCore(Core):
@@ -116,6 +265,7 @@ class SingleStageCore(Core):
                 self.nextState.IF["PC"] = self.state.IF["PC"] + 4;
                 self.state.ID["nop"] = False  
                 self.instructionCount += 1 
+                self.stallCycles += self.ext_imem.latency - 1
 
         else:
             self.state.IF["nop"] = True  
@@ -353,9 +503,11 @@ class SingleStageCore(Core):
         if not self.state.MEM["nop"]:
             if self.state.MEM["rd_mem"]:
                 self.state.MEM["Store_data"] = self.ext_dmem.readInstr(self.state.MEM["ALUresult"])
+                self.stallCycles += self.ext_dmem.latency - 1
             
             if self.state.MEM["wrt_mem"]:
                 self.ext_dmem.writeDataMem(self.state.MEM["ALUresult"], self.state.EX["Read_data2"])
+                self.stallCycles += self.ext_dmem.latency - 1
 
             self.state.WB["ALUresult"] = self.state.MEM["ALUresult"]  # Ensure ALU result is passed to WB stage
 
@@ -378,41 +530,54 @@ class SingleStageCore(Core):
 
 
     def step(self):
+        if self.stallCycles:
+            self.skipCycles(1)
+            return
+
+        pc = self.state.IF["PC"]
         self.IF()
         self.ID()
         self.EX()
         self.MEM()
         self.WB()
 
+        if self.retireListeners and not self.halted:
+            self.notifyRetire(self.retireRecord(pc))
 
         if self.state.IF["nop"]:
             self.halted = True
             self.report_performance_metrics()
     
         # Dump RF and print state
-        self.myRF.outputRF(self.cycle)  # Dump Register File
-        self.printState(self.nextState, self.cycle)  # Print states after executing the cycle
+        if self.traceEnabled:
+            self.myRF.outputRF(self.cycle)  # Dump Register File
+            self.printState(self.nextState, self.cycle)  # Print states after executing the cycle
         
         # Prepare for the next cycle
         self.state = self.nextState  # Update the current state
         self.cycle += 1
 
-    def report_performance_metrics(self):
-        total_cycles = self.cycle
-        total_instructions = self.instructionCount
-        average_cpi = total_cycles / total_instructions if total_instructions > 0 else 0
-        ipc = total_instructions / total_cycles if total_cycles > 0 else 0
-
-        print(f"Total Execution Cycles: {total_cycles}")
-        print(f"Total Instructions Executed: {total_instructions}")
-        print(f"Average CPI: {average_cpi:.2f}")
-        print(f"Instructions Per Cycle (IPC): {ipc:.2f}")
-
-
-    def printState(self, state, cycle):
-        printstate = ["-"*70 + "\n", "State after executing cycle: " + str(cycle) + "\n"]
-        printstate.append("IF.PC: " + str(state.IF["PC"]) + "\n")
-        printstate.append("IF.nop: " + str(state.IF["nop"]) + "\n")
+    def retireRecord(self, pc):
+        # Architectural effect of the instruction executed in this cycle, read back from the stage latches
+        instr = self.state.ID["Instr"]
+        rd = rdValue = memRead = memWrite = None
+        if not self.state.WB["nop"]:
+            if self.state.WB["wrt_enable"] and self.state.WB["Wrt_reg_addr"]:
+                rd = self.state.WB["Wrt_reg_addr"]
+                rdValue = self.myRF.readRF(rd) & 0xFFFFFFFF
+            address = self.state.MEM["ALUresult"] & 0xFFFFFFFF
+            if self.state.MEM["rd_mem"]:
+                memRead = (address, int(self.state.MEM["Store_data"], 16))
+            if self.state.MEM["wrt_mem"]:
+                memWrite = (address, self.state.EX["Read_data2"] & 0xFFFFFFFF)
+        return RetireRecord(self.cycle, pc, instr, decodeInstr(instr).op, rd, rdValue, memRead, memWrite)
+
+    def printState(self, state, cycle, repeat=1):
+        printstate = []
+        for c in range(cycle, cycle + repeat):
+            printstate.extend(["-"*70 + "\n", "State after executing cycle: " + str(c) + "\n"])
+            printstate.append("IF.PC: " + str(state.IF["PC"]) + "\n")
+            printstate.append("IF.nop: " + str(state.IF["nop"]) + "\n")
         
         perm = "w" if cycle == 0 else "a"
         with open(self.opFilePath, perm) as wf:
@@ -425,22 +590,44 @@ if __name__ == "__main__":
     #parse arguments for input file location
     parser = argparse.ArgumentParser(description='RV32I processor')
     parser.add_argument('--iodir', default="", type=str, help='Directory containing the input files.')
+    parser.add_argument('--inputdir', default=None, type=str, help='Directory with imem.txt/dmem.txt (default: <iodir>/' + DEFAULT_INPUT + ').')
+    parser.add_argument('--imem-latency', default=1, type=int, help='Cycles per instruction fetch.')
+    parser.add_argument('--dmem-latency', default=1, type=int, help='Cycles per data memory access.')
+    parser.add_argument('--event-driven', action='store_true', help='Skip stall cycles instead of ticking through them.')
+    parser.add_argument('--dmem-delta-every', default=0, type=int, help='Append a DMEM delta (written words only) every N cycles.')
     args = parser.parse_args()
 
     ioDir = os.path.abspath(args.iodir)
     print("IO Directory:", ioDir)
 
-    imem = InsMem("Imem", ioDir)
-    dmem_ss = DataMem("SS", ioDir)
-    dmem_fs = DataMem("FS", ioDir)
+    imem = InsMem("Imem", ioDir, args.inputdir)
+    dmem_ss = DataMem("SS", ioDir, args.inputdir)
+    dmem_fs = DataMem("FS", ioDir, args.inputdir)
+    imem.latency = args.imem_latency
+    dmem_ss.latency = dmem_fs.latency = args.dmem_latency
     
     ssCore = SingleStageCore(ioDir, imem, dmem_ss)
     # fsCore = FiveStageCore(ioDir, imem, dmem_fs)
 
+    if args.event_driven:
+        from scheduler import EventScheduler
+        scheduler = EventScheduler([ssCore])
+        label = args.dmem_delta_every
+        while label and not ssCore.halted:
+            # Stop at every delta boundary; stall cycles leave memory unchanged, so each delta
+            # matches the one the per-cycle loop below writes at the same cycle
+            scheduler.run(label)
+            if ssCore.halted and ssCore.cycle < label:
+                break
+            dmem_ss.outputDataMemDelta(label)
+            label += args.dmem_delta_every
+        scheduler.run()
 
     while(True):
         if not ssCore.halted:
             ssCore.step()
+            if args.dmem_delta_every and ssCore.cycle % args.dmem_delta_every == 0:
+                dmem_ss.outputDataMemDelta(ssCore.cycle)
         
         # if not fsCore.halted:
         #     fsCore.step()
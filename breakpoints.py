@@ -0,0 +1,195 @@
+from bisect import bisect_right
+from collections import namedtuple
+
+from hooks import installHook, removeHook
+from NYU_RV32I_6913 import SingleStageCore
+
+# reason is "breakpoint", "register" or "watchpoint"; cycle/pc are where the core stopped
+StopEvent = namedtuple("StopEvent", ["reason", "cycle", "pc", "detail"])
+
+# One data memory access that hit a watchpoint
+WatchHit = namedtuple("WatchHit", ["watchId", "kind", "address", "value"])
+
+
+class IntervalIndex(object):
+    # Address ranges [start, end) flattened into sorted elementary segments, each carrying the
+    # ids of all ranges covering it. Updates rebuild the segments; lookups are a single bisect.
+    def __init__(self):
+        self.ranges = {}
+        self.bounds = []
+        self.covering = []
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def add(self, rangeId, start, end):
+        self.ranges[rangeId] = (start, end)
+        self.rebuild()
+
+    def remove(self, rangeId):
+        del self.ranges[rangeId]
+        self.rebuild()
+
+    def rebuild(self):
+        self.bounds = sorted(set(b for r in self.ranges.values() for b in r))
+        self.covering = [tuple(i for i, (s, e) in self.ranges.items() if s <= lo < e) for lo in self.bounds]
+
+    def find(self, start, end):
+        # Ids of all ranges overlapping [start, end), each reported once
+        pos = bisect_right(self.bounds, start) - 1
+        found = {}
+        if pos < 0:
+            pos = 0
+        while pos < len(self.bounds) and self.bounds[pos] < end:
+            for rangeId in self.covering[pos]:
+                found[rangeId] = None
+            pos += 1
+        return tuple(found)
+
+
+class Debugger(object):
+    # PC breakpoints, register-value conditions and data memory watchpoints for a Core.
+    # Memory hooks are only installed while watchpoints exist, and run() falls back to the
+    # plain step loop when nothing is set, so an idle debugger costs nothing per cycle.
+    # On the single stage core a breakpoint stops before the instruction at that PC executes.
+    # Other cores may fetch several instructions per cycle, so IF.PC can step over a breakpoint;
+    # there it stops after the cycle in which an instruction at that PC retires, with the
+    # RetireRecord as detail.
+    def __init__(self, core):
+        self.core = core
+        self.breakpoints = set()
+        self.conditions = {}
+        self.readWatches = IntervalIndex()
+        self.writeWatches = IntervalIndex()
+        self.hooks = {}
+        self.hits = []
+        self.nextId = 0
+        self.resumeAt = None
+
+    def newId(self):
+        self.nextId += 1
+        return self.nextId
+
+    def addBreakpoint(self, pc):
+        self.breakpoints.add(pc)
+
+    def removeBreakpoint(self, pc):
+        self.breakpoints.discard(pc)
+
+    def addCondition(self, reg, predicate):
+        # Stop after the cycle in which predicate(unsigned value of register reg) becomes true
+        conditionId = self.newId()
+        self.conditions[conditionId] = [reg, predicate, predicate(self.core.myRF.Registers[reg] & 0xFFFFFFFF)]
+        return conditionId
+
+    def removeCondition(self, conditionId):
+        del self.conditions[conditionId]
+
+    def addWatchpoint(self, start, end=None, read=False, write=True):
+        # Watch byte addresses [start, end); a word access hits if any of its four bytes is watched
+        end = start + 4 if end is None else end
+        watchId = self.newId()
+        if read:
+            self.readWatches.add(watchId, start, end)
+        if write:
+            self.writeWatches.add(watchId, start, end)
+        self.updateHooks()
+        return watchId
+
+    def removeWatchpoint(self, watchId):
+        for index in (self.readWatches, self.writeWatches):
+            if watchId in index.ranges:
+                index.remove(watchId)
+        self.updateHooks()
+
+    def updateHooks(self):
+        dmem = self.core.ext_dmem
+        for name, index, wrap in (("readInstr", self.readWatches, self.wrapRead),
+                                  ("writeDataMem", self.writeWatches, self.wrapWrite)):
+            if len(index) and name not in self.hooks:
+                self.hooks[name] = installHook(dmem, name, wrap)
+            elif not len(index) and name in self.hooks:
+                removeHook(self.hooks.pop(name))
+
+    def detach(self):
+        for name in list(self.hooks):
+            removeHook(self.hooks.pop(name))
+
+    def wrapRead(self, readInstr):
+        find, hits = self.readWatches.find, self.hits
+
+        def hooked(ReadAddress):
+            value = readInstr(ReadAddress)
+            index = ReadAddress // 4 * 4
+            for watchId in find(index, index + 4):
+                hits.append(WatchHit(watchId, "read", ReadAddress, value))
+            return value
+        return hooked
+
+    def wrapWrite(self, writeDataMem):
+        find, hits = self.writeWatches.find, self.hits
+
+        def hooked(Address, WriteData):
+            writeDataMem(Address, WriteData)
+            index = Address // 4 * 4
+            for watchId in find(index, index + 4):
+                hits.append(WatchHit(watchId, "write", Address, WriteData))
+        return hooked
+
+    def run(self, maxCycles=None):
+        # Run until a stop condition fires (returns a StopEvent) or the core halts (returns None)
+        core = self.core
+        if not (self.breakpoints or self.conditions or self.hooks):
+            while not core.halted and (maxCycles is None or core.cycle < maxCycles):
+                core.step()
+            return None
+
+        onFetch = isinstance(core, SingleStageCore)
+        retired = []
+        if self.breakpoints and not onFetch:
+            core.retireListeners.append(retired.append)
+        try:
+            return self.runUntilStop(maxCycles, onFetch, retired)
+        finally:
+            if retired.append in core.retireListeners:
+                core.retireListeners.remove(retired.append)
+
+    def runUntilStop(self, maxCycles, onFetch, retired):
+        core = self.core
+        breakpoints, conditions, hits = self.breakpoints, self.conditions, self.hits
+        registers = core.myRF.Registers
+        while not core.halted and (maxCycles is None or core.cycle < maxCycles):
+            if core.stallCycles:
+                # Nothing changes while the core waits, so breakpoints are only tested in the
+                # cycle that actually executes the instruction
+                skip = core.stallCycles if maxCycles is None else min(core.stallCycles, maxCycles - core.cycle)
+                core.skipCycles(skip)
+                continue
+            if onFetch:
+                pc = core.state.IF["PC"]
+                # Resuming from a breakpoint must execute that instruction instead of stopping again
+                if pc in breakpoints and self.resumeAt != (core.cycle, pc):
+                    self.resumeAt = (core.cycle, pc)
+                    return StopEvent("breakpoint", core.cycle, pc, None)
+            core.step()
+
+            if retired:
+                hit = next((record for record in retired if record.pc in breakpoints), None)
+                del retired[:]
+                if hit is not None:
+                    return StopEvent("breakpoint", core.cycle, hit.pc, hit)
+
+            if hits:
+                detail = list(hits)
+                del hits[:]
+                return StopEvent("watchpoint", core.cycle, core.state.IF["PC"], detail)
+            fired = None
+            for conditionId, condition in conditions.items():
+                reg, predicate, wasTrue = condition
+                value = registers[reg] & 0xFFFFFFFF
+                condition[2] = predicate(value)
+                if condition[2] and not wasTrue and fired is None:
+                    fired = (conditionId, reg, value)
+            if fired is not None:
+                return StopEvent("register", core.cycle, core.state.IF["PC"], fired)
+        return None
@@ -0,0 +1,117 @@
+import os
+import argparse
+
+from NYU_RV32I_6913 import InsMem, DataMem, SingleStageCore
+from refmodel import ReferenceCore, MASK32
+from tomasulo import OutOfOrderCore
+
+
+class Divergence(object):
+    def __init__(self, field, expected, actual, refRecord, dutRecord, cycle):
+        self.field = field
+        self.expected = expected
+        self.actual = actual
+        self.refRecord = refRecord
+        self.dutRecord = dutRecord
+        self.cycle = cycle
+
+    def __str__(self):
+        lines = ["Divergence in " + self.field + " at DUT cycle " + str(self.cycle)]
+        lines.append("  expected: " + str(self.expected))
+        lines.append("  actual:   " + str(self.actual))
+        lines.append("  reference retired: " + str(self.refRecord))
+        lines.append("  core retired:      " + str(self.dutRecord))
+        return "\n".join(lines)
+
+
+class Cosim(object):
+    # Runs a core and the reference model in lockstep, comparing every retired instruction.
+    # Trace dumps of the core are switched off; only the first divergence is reported.
+    def __init__(self, core, ref=None):
+        self.core = core
+        self.ref = ref if ref is not None else ReferenceCore(core.ext_imem, core.ext_dmem)
+        self.pending = []
+        self.retired = 0
+        core.traceEnabled = False
+        core.retireListeners.append(self.pending.append)
+
+    def compare(self, refRecord, dutRecord):
+        def mismatch(field, expected, actual):
+            return Divergence(field, expected, actual, refRecord, dutRecord, self.core.cycle - 1)
+
+        if refRecord is None:
+            return mismatch("halt", "reference halted", "core retired an instruction")
+        if dutRecord.pc != refRecord.pc:
+            return mismatch("PC", refRecord.pc, dutRecord.pc)
+        if dutRecord.instr != refRecord.instr:
+            return mismatch("instruction", hex(refRecord.instr), hex(dutRecord.instr))
+        if (dutRecord.rd, dutRecord.rdValue) != (refRecord.rd, refRecord.rdValue):
+            return mismatch("register write", (refRecord.rd, refRecord.rdValue), (dutRecord.rd, dutRecord.rdValue))
+        dutWrite = dutRecord.memWrite and (dutRecord.memWrite[0] // 4 * 4, dutRecord.memWrite[1] & MASK32)
+        refWrite = refRecord.memWrite and (refRecord.memWrite[0] // 4 * 4, refRecord.memWrite[1] & MASK32)
+        if dutWrite != refWrite:
+            return mismatch("memory write", refWrite, dutWrite)
+        return None
+
+    def compareFinalState(self):
+        # Catch writes the core made outside of any reported retirement
+        for reg in range(32):
+            expected = self.ref.registers[reg]
+            actual = self.core.myRF.readRF(reg) & MASK32
+            if expected != actual:
+                return Divergence("final register x" + str(reg), expected, actual, None, None, self.core.cycle)
+        refMem, dutMem = self.ref.dmem.DMem, self.core.ext_dmem.DMem
+        for index in range(max(len(refMem), len(dutMem))):
+            expected = refMem[index] if index < len(refMem) else "00000000"
+            actual = dutMem[index] if index < len(dutMem) else "00000000"
+            if expected != actual:
+                return Divergence("final memory byte " + str(index), expected, actual, None, None, self.core.cycle)
+        return None
+
+    def run(self, maxCycles=None):
+        core, ref = self.core, self.ref
+        while not core.halted:
+            if maxCycles is not None and core.cycle >= maxCycles:
+                return Divergence("cycle limit", "halt within " + str(maxCycles) + " cycles", "still running",
+                                  None, None, core.cycle)
+            core.step()
+            for dutRecord in self.pending:
+                divergence = self.compare(ref.step(), dutRecord)
+                if divergence is not None:
+                    return divergence
+                self.retired += 1
+            del self.pending[:]
+
+        # A core that stops fetching must leave the reference at (or just past) its HALT
+        if not ref.halted:
+            refRecord = ref.step()
+            if refRecord is not None and refRecord.op != "halt":
+                return Divergence("halt", "retire " + str(refRecord.op), "core halted", refRecord, None, core.cycle)
+            ref.halted = True
+        return self.compareFinalState()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='RV32I lockstep co-simulation against the reference model')
+    parser.add_argument('--iodir', default="", type=str, help='Directory containing the input files.')
+    parser.add_argument('--inputdir', default=None, type=str, help='Directory with imem.txt/dmem.txt.')
+    parser.add_argument('--core', default="ss", choices=["ss", "ooo"], help='Core under test: single stage or out-of-order.')
+    parser.add_argument('--max-cycles', default=None, type=int, help='Stop with a divergence after this many cycles.')
+    args = parser.parse_args()
+
+    ioDir = os.path.abspath(args.iodir)
+    print("IO Directory:", ioDir)
+
+    imem = InsMem("Imem", ioDir, args.inputdir)
+    if args.core == "ooo":
+        core = OutOfOrderCore(ioDir, imem, DataMem("OoO", ioDir, args.inputdir))
+    else:
+        core = SingleStageCore(ioDir, imem, DataMem("SS", ioDir, args.inputdir))
+
+    cosim = Cosim(core)
+    divergence = cosim.run(args.max_cycles)
+    if divergence is None:
+        print("Lockstep co-simulation passed: " + str(cosim.retired) + " instructions retired identically")
+    else:
+        print(divergence)
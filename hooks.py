@@ -0,0 +1,68 @@
+# Per-instance method interposition used by the debugging and analysis tools.
+# A hook shadows the class method with an instance attribute, so objects that are
+# not being observed keep calling the plain method with no extra cost.
+#
+# Every object keeps its wrapper factories per method name in obj._hooks; the instance
+# attribute is rebuilt from the unhooked method on each install or removal, so tools can
+# remove their hooks in any order without dropping the hooks of other tools.
+# obj.__dict__ is never touched: on CPython 3.11+ materialising it slows down every
+# attribute access on the object.
+
+
+def installHook(obj, name, makeWrapper):
+    hooks = getattr(obj, "_hooks", None)
+    if hooks is None:
+        hooks = obj._hooks = {}
+    if name not in hooks:
+        current = getattr(obj, name)
+        isClassMethod = getattr(current, "__self__", None) is obj and \
+            getattr(current, "__func__", None) is getattr(type(obj), name, None)
+        hooks[name] = (None if isClassMethod else current, [])  # unhooked instance attribute, if any
+    hooks[name][1].append(makeWrapper)
+    rebuildHooks(obj, name)
+    return (obj, name, makeWrapper)
+
+
+def removeHook(hook):
+    obj, name, makeWrapper = hook
+    wrappers = obj._hooks[name][1]
+    for i, installed in enumerate(wrappers):
+        if installed is makeWrapper:
+            del wrappers[i]
+            break
+    rebuildHooks(obj, name)
+
+
+def rebuildHooks(obj, name):
+    hooks = obj._hooks
+    base, wrappers = hooks[name]
+    if not wrappers:
+        del hooks[name]
+        if not hooks:
+            del obj._hooks
+        if base is None:
+            delattr(obj, name)
+        else:
+            setattr(obj, name, base)
+        return
+    setattr(obj, name, composeHooks(obj, name, wrappers))
+
+
+def composeHooks(obj, name, wrappers):
+    base = obj._hooks[name][0]
+    method = base if base is not None else getattr(type(obj), name).__get__(obj)
+    for makeWrapper in wrappers:
+        method = makeWrapper(method)
+    return method
+
+
+def suspendHooks(obj, keep=()):
+    # Run obj's hooked methods with only the hooks in `keep` until resumeHooks(obj)
+    kept = [hook[2] for hook in keep if hook[0] is obj]
+    for name, (_, wrappers) in getattr(obj, "_hooks", {}).items():
+        setattr(obj, name, composeHooks(obj, name, [w for w in wrappers if any(w is k for k in kept)]))
+
+
+def resumeHooks(obj):
+    for name in list(getattr(obj, "_hooks", {})):
+        rebuildHooks(obj, name)
@@ -0,0 +1,232 @@
+import os
+import random
+import argparse
+from collections import Counter, OrderedDict
+
+from NYU_RV32I_6913 import InsMem, DataMem, SingleStageCore
+
+MASK32 = 0xFFFFFFFF
+
+
+class CacheLine(object):
+    __slots__ = ("state", "words")
+
+    def __init__(self, state, words):
+        self.state = state
+        self.words = words
+
+
+class SnoopBus(object):
+    # Shared bus between the private caches and the shared DataMem. Every request is broadcast to
+    # all other caches, which flush and downgrade or invalidate their copy of the line.
+    def __init__(self, memory, lineSize):
+        self.memory = memory
+        self.lineSize = lineSize
+        self.caches = []
+        self.transactions = Counter()
+
+    def request(self, requester, kind, tag):
+        # kind: "BusRd" (read miss), "BusRdX" (write miss) or "BusUpgr" (write to a shared line).
+        # Returns True if any other cache held the line.
+        self.transactions[kind] += 1
+        shared = False
+        for cache in self.caches:
+            if cache is not requester and cache.snoop(kind, tag):
+                shared = True
+        return shared
+
+    def readLine(self, tag):
+        base = tag * self.lineSize
+        return [int(self.memory.readInstr(a), 16) for a in range(base, base + self.lineSize, 4)]
+
+    def writeLine(self, tag, words):
+        self.transactions["WriteBack"] += 1
+        base = tag * self.lineSize
+        for i, word in enumerate(words):
+            self.memory.writeDataMem(base + 4 * i, word)
+
+
+class CoherentCache(object):
+    # Private set-associative write-back L1 with LRU replacement, kept coherent with MSI or MESI.
+    # It offers the DataMem interface the cores use (readInstr, writeDataMem, latency), so a core
+    # takes it as its ext_dmem unchanged; latency reflects the most recent access.
+    def __init__(self, name, bus, sizeBytes=1024, ways=2, protocol="MESI", hitLatency=1, missLatency=10):
+        if protocol not in ("MSI", "MESI"):
+            raise ValueError("Unknown coherence protocol " + str(protocol))
+        self.id = name
+        self.bus = bus
+        self.lineSize = bus.lineSize
+        self.ways = ways
+        self.numSets = max(1, sizeBytes // (self.lineSize * ways))
+        self.sets = [OrderedDict() for _ in range(self.numSets)]
+        self.protocol = protocol
+        self.hitLatency = hitLatency
+        self.missLatency = missLatency
+        self.latency = hitLatency
+        self.stats = Counter()
+        bus.caches.append(self)
+
+    def lookup(self, tag):
+        lines = self.sets[tag % self.numSets]
+        line = lines.get(tag)
+        if line is not None:
+            lines.move_to_end(tag)
+        return line
+
+    def install(self, tag, state):
+        lines = self.sets[tag % self.numSets]
+        if len(lines) >= self.ways:
+            victimTag, victim = lines.popitem(last=False)
+            self.stats["evictions"] += 1
+            if victim.state == "M":
+                self.stats["writebacks"] += 1
+                self.bus.writeLine(victimTag, victim.words)
+        line = CacheLine(state, self.bus.readLine(tag))
+        lines[tag] = line
+        return line
+
+    def snoop(self, kind, tag):
+        lines = self.sets[tag % self.numSets]
+        line = lines.get(tag)
+        if line is None:
+            return False
+        if line.state == "M":
+            self.stats["interventions"] += 1
+            self.bus.writeLine(tag, line.words)
+        if kind == "BusRd":
+            line.state = "S"
+        else:
+            self.stats["invalidations"] += 1
+            del lines[tag]
+        return True
+
+    def readInstr(self, ReadAddress):
+        address = ReadAddress // 4 * 4
+        tag, offset = address // self.lineSize, address % self.lineSize // 4
+        line = self.lookup(tag)
+        if line is not None:
+            self.stats["readHits"] += 1
+            self.latency = self.hitLatency
+        else:
+            self.stats["readMisses"] += 1
+            shared = self.bus.request(self, "BusRd", tag)
+            line = self.install(tag, "S" if shared or self.protocol == "MSI" else "E")
+            self.latency = self.missLatency
+        return hex(line.words[offset])
+
+    def writeDataMem(self, Address, WriteData):
+        address = Address // 4 * 4
+        tag, offset = address // self.lineSize, address % self.lineSize // 4
+        line = self.lookup(tag)
+        self.latency = self.hitLatency
+        if line is None:
+            self.stats["writeMisses"] += 1
+            self.bus.request(self, "BusRdX", tag)
+            line = self.install(tag, "M")
+            self.latency = self.missLatency
+        elif line.state == "S":
+            self.stats["upgrades"] += 1
+            self.bus.request(self, "BusUpgr", tag)
+            self.latency = self.missLatency
+        else:
+            self.stats["writeHits"] += 1  # M, or E which turns into M without a bus transaction
+        line.state = "M"
+        line.words[offset] = WriteData & MASK32
+
+    def flush(self):
+        # Write back every modified line and empty the cache (end of simulation)
+        for lines in self.sets:
+            for tag, line in lines.items():
+                if line.state == "M":
+                    self.stats["writebacks"] += 1
+                    self.bus.writeLine(tag, line.words)
+            lines.clear()
+
+
+class MultiCoreSystem(object):
+    # N harts with private RegisterFiles and L1 caches over one shared DataMem. programs gives
+    # the input directory of each hart (repeat one entry to run the same program on every hart);
+    # hart i starts with i in register hartIdReg (a0 by default). Each scheduling round runs
+    # every live hart for `quantum` cycles, in hart order or in a seeded random order.
+    def __init__(self, ioDir, programs, dmem, coreClass=SingleStageCore, protocol="MESI", cacheSize=1024,
+                 lineSize=16, ways=2, hitLatency=1, missLatency=10, quantum=1, interleave="roundrobin",
+                 seed=0, hartIdReg=10):
+        if interleave not in ("roundrobin", "random"):
+            raise ValueError("Unknown interleaving " + str(interleave))
+        self.dmem = dmem
+        self.bus = SnoopBus(dmem, lineSize)
+        self.quantum = quantum
+        self.interleave = interleave
+        self.random = random.Random(seed)
+        self.rounds = 0
+        self.cores = []
+        imems = {}
+        for hart, program in enumerate(programs):
+            hartDir = os.path.join(ioDir, "hart" + str(hart))
+            os.makedirs(hartDir, exist_ok=True)
+            if program not in imems:
+                imems[program] = InsMem("Imem", ioDir, program)
+            cache = CoherentCache("L1_" + str(hart), self.bus, cacheSize, ways, protocol, hitLatency, missLatency)
+            core = coreClass(hartDir, imems[program], cache)
+            core.myRF.outputFile = os.path.join(hartDir, "RFResult.txt")
+            core.myRF.writeRF(hartIdReg, hart)
+            self.cores.append(core)
+
+    def run(self, maxRounds=None):
+        while not all(core.halted for core in self.cores):
+            if maxRounds is not None and self.rounds >= maxRounds:
+                break
+            order = [core for core in self.cores if not core.halted]
+            if self.interleave == "random":
+                self.random.shuffle(order)
+            for core in order:
+                for _ in range(self.quantum):
+                    if core.halted:
+                        break
+                    core.step()
+            self.rounds += 1
+        for core in self.cores:
+            core.ext_dmem.flush()
+
+    def report(self):
+        for hart, core in enumerate(self.cores):
+            cycles, instructions, cpi, ipc = core.metrics()
+            cache = core.ext_dmem.stats
+            print(f"Hart {hart}: cycles {cycles}, instructions {instructions}, CPI {cpi:.2f}, IPC {ipc:.2f}, "
+                  + ", ".join(f"{k} {cache[k]}" for k in sorted(cache)))
+        totalInstructions = sum(core.instructionCount for core in self.cores)
+        totalCycles = max(core.cycle for core in self.cores)
+        print(f"Aggregate: instructions {totalInstructions}, cycles {totalCycles}, "
+              f"IPC {totalInstructions / totalCycles if totalCycles else 0:.2f}")
+        print("Bus transactions: " + ", ".join(f"{k} {v}" for k, v in sorted(self.bus.transactions.items())))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Multi-hart RV32I simulation with coherent private caches')
+    parser.add_argument('--iodir', default="", type=str, help='Directory for output files.')
+    parser.add_argument('--programs', nargs='+', required=True, help='Input directory per hart (imem.txt); the first one also provides dmem.txt.')
+    parser.add_argument('--harts', default=None, type=int, help='Run the first program on this many harts.')
+    parser.add_argument('--protocol', default="MESI", choices=["MSI", "MESI"])
+    parser.add_argument('--cache-size', default=1024, type=int, help='L1 size in bytes.')
+    parser.add_argument('--line-size', default=16, type=int, help='Cache line size in bytes.')
+    parser.add_argument('--ways', default=2, type=int)
+    parser.add_argument('--hit-latency', default=1, type=int)
+    parser.add_argument('--miss-latency', default=10, type=int)
+    parser.add_argument('--quantum', default=1, type=int, help='Cycles each hart runs per scheduling round.')
+    parser.add_argument('--interleave', default="roundrobin", choices=["roundrobin", "random"])
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    ioDir = os.path.abspath(args.iodir)
+    print("IO Directory:", ioDir)
+
+    programs = [args.programs[0]] * args.harts if args.harts else args.programs
+    dmem_mc = DataMem("MC", ioDir, programs[0])
+    system = MultiCoreSystem(ioDir, programs, dmem_mc, protocol=args.protocol, cacheSize=args.cache_size,
+                             lineSize=args.line_size, ways=args.ways, hitLatency=args.hit_latency,
+                             missLatency=args.miss_latency, quantum=args.quantum, interleave=args.interleave,
+                             seed=args.seed)
+    system.run()
+    system.report()
+    dmem_mc.outputDataMem()
@@ -0,0 +1,217 @@
+import os
+import random
+import argparse
+
+from NYU_RV32I_6913 import MemSize, HALT_INSTR, Decoded, InsMem, DataMem, SingleStageCore, decodeInstr
+
+LOOP_REG = 31  # loop counter, never written by generated code outside the loop control
+DEST_REGS = range(1, 31)
+SOURCE_REGS = range(0, 31)
+
+R_FUNCT = {"add": (0, 0x00), "sub": (0, 0x20), "xor": (4, 0x00), "or": (6, 0x00), "and": (7, 0x00)}
+I_FUNCT = {"addi": 0, "xori": 4, "ori": 6, "andi": 7}
+B_FUNCT = {"beq": 0, "bne": 1}
+
+DEFAULT_MIX = {"alu": 4, "imm": 4, "load": 2, "store": 2, "branch": 1, "jal": 1, "loop": 1}
+
+
+def encodeInstr(d):
+    # Inverse of decodeInstr; loads use funct3 000 like the course sample programs
+    op, rd, rs1, rs2, imm = d
+    if op == "halt":
+        return HALT_INSTR
+    elif op in R_FUNCT:
+        funct3, funct7 = R_FUNCT[op]
+        return funct7 << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | 0x33
+    elif op in I_FUNCT:
+        return (imm & 0xFFF) << 20 | rs1 << 15 | I_FUNCT[op] << 12 | rd << 7 | 0x13
+    elif op == "lw":
+        return (imm & 0xFFF) << 20 | rs1 << 15 | rd << 7 | 0x03
+    elif op == "sw":
+        return ((imm >> 5) & 0x7F) << 25 | rs2 << 20 | rs1 << 15 | 2 << 12 | (imm & 0x1F) << 7 | 0x23
+    elif op in B_FUNCT:
+        return (((imm >> 12) & 1) << 31 | ((imm >> 5) & 0x3F) << 25 | rs2 << 20 | rs1 << 15 | B_FUNCT[op] << 12
+                | ((imm >> 1) & 0xF) << 8 | ((imm >> 11) & 1) << 7 | 0x63)
+    elif op == "jal":
+        return (((imm >> 20) & 1) << 31 | ((imm >> 1) & 0x3FF) << 21 | ((imm >> 11) & 1) << 20
+                | ((imm >> 12) & 0xFF) << 12 | rd << 7 | 0x6F)
+    raise ValueError("Cannot encode " + str(op))
+
+
+def formatAsm(d):
+    op, rd, rs1, rs2, imm = d
+    if op == "halt":
+        return "HALT"
+    elif op in R_FUNCT:
+        return f"{op.upper()} R{rd}, R{rs1}, R{rs2}"
+    elif op in I_FUNCT or op == "lw":
+        return f"{op.upper()} R{rd}, R{rs1}, #{imm}"
+    elif op == "sw":
+        return f"SW R{rs2}, R{rs1}, #{imm}"
+    elif op in B_FUNCT:
+        return f"{op.upper()} R{rs1}, R{rs2}, #{imm}"
+    return f"JAL R{rd}, #{imm}"
+
+
+class ProgramGenerator(object):
+    # Constrained-random programs over the supported RV32I subset. Termination is guaranteed by
+    # construction: all branches and jumps go forward, except the back edge of a counted loop
+    # (x31 from a trip count down to 0) whose body cannot write x31, contains no nested loop and
+    # cannot be entered from outside. Data accesses use x0-relative word offsets inside
+    # [0, dataBytes). depDensity is the chance that a source register is one of the last four
+    # destinations, which controls how tightly instructions depend on each other.
+    def __init__(self, seed=None, mix=None, depDensity=0.5, dataBytes=256, maxTrip=8, maxLoopBody=16, maxSkip=4):
+        if not 4 <= dataBytes <= min(MemSize, 2048) or dataBytes % 4:
+            raise ValueError("dataBytes must be a multiple of 4 within the memory model and the 12-bit offset range")
+        self.rng = random.Random(seed)
+        self.mix = dict(DEFAULT_MIX, **(mix or {}))
+        unknown = set(self.mix) - set(DEFAULT_MIX)
+        if unknown:
+            raise ValueError("Unknown instruction classes: " + ", ".join(sorted(unknown)))
+        if any(w < 0 for w in self.mix.values()):
+            raise ValueError("Instruction mix weights must not be negative")
+        if not any(w > 0 for k, w in self.mix.items() if k != "loop"):
+            raise ValueError("The instruction mix needs a positive weight on a class other than loop")
+        self.depDensity = depDensity
+        self.dataBytes = dataBytes
+        self.maxTrip = maxTrip
+        self.maxLoopBody = maxLoopBody
+        self.maxSkip = maxSkip
+        self.recent = []
+
+    def pickKind(self, allowLoop):
+        kinds = [k for k, w in self.mix.items() if w > 0 and (allowLoop or k != "loop")]
+        return self.rng.choices(kinds, [self.mix[k] for k in kinds])[0]
+
+    def source(self):
+        if self.recent and self.rng.random() < self.depDensity:
+            return self.rng.choice(self.recent)
+        return self.rng.choice(SOURCE_REGS)
+
+    def dest(self):
+        rd = self.rng.choice(DEST_REGS)
+        self.recent = (self.recent + [rd])[-4:]
+        return rd
+
+    def offset(self):
+        return self.rng.randrange(0, self.dataBytes, 4)
+
+    def instruction(self, kind):
+        # Branch and jump targets are left as None and resolved once the layout is known
+        rng = self.rng
+        if kind == "alu":
+            rs1, rs2 = self.source(), self.source()
+            return [rng.choice(list(R_FUNCT)), self.dest(), rs1, rs2, 0]
+        elif kind == "imm":
+            rs1 = self.source()
+            return [rng.choice(list(I_FUNCT)), self.dest(), rs1, 0, rng.randint(-2048, 2047)]
+        elif kind == "load":
+            return ["lw", self.dest(), 0, 0, self.offset()]
+        elif kind == "store":
+            return ["sw", 0, 0, self.source(), self.offset()]
+        elif kind == "branch":
+            return [rng.choice(list(B_FUNCT)), 0, self.source(), self.source(), None]
+        return ["jal", self.dest(), 0, 0, None]
+
+    def generate(self, length):
+        # Returns the program as a list of Decoded tuples: `length` instructions, then HALT
+        rng = self.rng
+        code = []
+        jumps = []  # (index, last allowed target index or None for "up to HALT")
+        loops = []  # (first body index, back-edge index): no jump from outside may land in here
+        while len(code) < length:
+            room = length - len(code) - 3
+            kind = self.pickKind(allowLoop=room >= 1)
+            if kind != "loop":
+                code.append(self.instruction(kind))
+                if code[-1][4] is None:
+                    jumps.append((len(code) - 1, None))
+                continue
+
+            bodyLength = rng.randint(1, min(self.maxLoopBody, room))
+            code.append(["addi", LOOP_REG, 0, 0, rng.randint(1, self.maxTrip)])
+            start = len(code)
+            for _ in range(bodyLength):
+                code.append(self.instruction(self.pickKind(allowLoop=False)))
+                if code[-1][4] is None:
+                    jumps.append((len(code) - 1, start + bodyLength))  # at most the decrement
+            code.append(["addi", LOOP_REG, LOOP_REG, 0, -1])
+            code.append(["bne", 0, LOOP_REG, 0, -4 * (bodyLength + 1)])
+            loops.append((start, len(code) - 1))
+        code.append(["halt", 0, 0, 0, 0])
+
+        for index, last in jumps:
+            if last is None:
+                last = len(code) - 1
+            targets = [t for t in range(index + 1, min(index + 1 + self.maxSkip, last) + 1)
+                       if not any(start <= t <= end for start, end in loops if not start <= index <= end)]
+            code[index][4] = 4 * (rng.choice(targets) - index)
+        return [Decoded(*instr) for instr in code]
+
+    def dataImage(self):
+        return [format(self.rng.getrandbits(8), '08b') for _ in range(self.dataBytes)]
+
+
+def writeProgram(outDir, program, data):
+    os.makedirs(outDir, exist_ok=True)
+    words = [encodeInstr(d) for d in program]
+    with open(os.path.join(outDir, "imem.txt"), "w") as im:
+        for word in words:
+            bits = format(word, '032b')
+            im.writelines([bits[0:8] + "\n", bits[8:16] + "\n", bits[16:24] + "\n", bits[24:32] + "\n"])
+    with open(os.path.join(outDir, "dmem.txt"), "w") as dm:
+        dm.write("\n".join(data) + "\n")
+    with open(os.path.join(outDir, "Code.asm"), "w") as asm:
+        asm.writelines(f"{4 * i}:\t{formatAsm(d)}\n" for i, d in enumerate(program))
+        asm.write("\n/* Binary\n")
+        asm.writelines(format(word, '032b') + "\n" for word in words)
+        asm.write("*/")
+
+
+def parseMix(text):
+    # "alu=4,load=1" -> {"alu": 4, "load": 1}
+    return dict((k, float(v)) for k, v in (item.split("=") for item in text.split(",")))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Constrained-random RV32I program generator')
+    parser.add_argument('--outdir', default="generated", type=str, help='One testcase<i> directory is created per program.')
+    parser.add_argument('--count', default=1, type=int, help='Number of programs.')
+    parser.add_argument('--length', default=100, type=int, help='Static instructions per program before HALT.')
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--mix', default=None, type=parseMix, help='Weights such as alu=4,imm=4,load=2,store=2,branch=1,jal=1,loop=1.')
+    parser.add_argument('--dep-density', default=0.5, type=float, help='Probability that a source is a recent destination.')
+    parser.add_argument('--data-bytes', default=256, type=int, help='Size of dmem.txt; all accesses stay inside it.')
+    parser.add_argument('--max-trip', default=8, type=int, help='Upper bound on loop trip counts.')
+    parser.add_argument('--check', default=None, type=str, help='Co-simulate each program on these cores (ss,ooo) against the reference model.')
+    args = parser.parse_args()
+
+    outDir = os.path.abspath(args.outdir)
+    for i in range(args.count):
+        generator = ProgramGenerator(args.seed + i, args.mix, args.dep_density, args.data_bytes, args.max_trip)
+        program = generator.generate(args.length)
+        assert all(decodeInstr(encodeInstr(d)) == d for d in program)
+        writeProgram(os.path.join(outDir, "testcase" + str(i)), program, generator.dataImage())
+    print("Wrote " + str(args.count) + " programs to " + outDir)
+
+    if args.check:
+        import io
+        import contextlib
+        from cosim import Cosim
+        from tomasulo import OutOfOrderCore
+
+        coreClasses = {"ss": SingleStageCore, "ooo": OutOfOrderCore}
+        maxCycles = 1000 + 20 * args.length * args.max_trip
+        for name in args.check.split(","):
+            failed = 0
+            for i in range(args.count):
+                programDir = os.path.join(outDir, "testcase" + str(i))
+                core = coreClasses[name](programDir, InsMem("Imem", programDir, programDir),
+                                         DataMem("Check", programDir, programDir))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    divergence = Cosim(core).run(maxCycles)
+                if divergence is not None:
+                    failed += 1
+                    print(f"{name} testcase{i}: {divergence.field} diverged at cycle {divergence.cycle}")
+            print(f"{name}: {args.count - failed}/{args.count} programs match the reference model")
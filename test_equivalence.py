@@ -0,0 +1,127 @@
+import io
+import os
+import sys
+import random
+import filecmp
+import tempfile
+import contextlib
+import subprocess
+
+from NYU_RV32I_6913 import InsMem, DataMem, SingleStageCore
+from tomasulo import OutOfOrderCore
+from scheduler import EventScheduler
+from reverse import ReverseExecution
+from progen import ProgramGenerator, writeProgram
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = [os.path.join(ROOT, "Sample_Testcases_SS", "input", "testcase" + str(i)) for i in range(3)]
+
+
+def generatedPrograms(workDir, straightLine=False, count=4):
+    # Programs from progen; straight-line ones (no branches, jumps or loops) also run on the
+    # single stage core, whose branch handling is known to be wrong
+    mix = dict(branch=0, jal=0, loop=0) if straightLine else None
+    programs = []
+    for seed in range(count):
+        generator = ProgramGenerator(seed, mix)
+        programDir = os.path.join(workDir, ("line" if straightLine else "prog") + str(seed))
+        writeProgram(programDir, generator.generate(80), generator.dataImage())
+        programs.append(programDir)
+    return programs
+
+
+def sameFiles(dirA, dirB, names):
+    for name in names:
+        if not filecmp.cmp(os.path.join(dirA, name), os.path.join(dirB, name), shallow=False):
+            return name
+    return None
+
+
+def test_event_driven_matches_ticking():
+    # Event-driven runs must write byte-identical RF, state, DMEM and DMEM delta files
+    workDir = tempfile.mkdtemp()
+    simulator = os.path.join(ROOT, "NYU_RV32I_6913.py")
+    for n, program in enumerate(SAMPLES + generatedPrograms(workDir, straightLine=True)):
+        for imemLatency, dmemLatency, deltaEvery in ((1, 1, 1), (3, 4, 5), (2, 7, 3)):
+            outDirs = []
+            for mode in ([], ["--event-driven"]):
+                outDir = os.path.join(workDir, "ss%d_%d%d%d%s" % (n, imemLatency, dmemLatency, deltaEvery, "".join(mode)))
+                os.makedirs(outDir)
+                subprocess.run([sys.executable, simulator, "--iodir", outDir, "--inputdir", program,
+                                "--imem-latency", str(imemLatency), "--dmem-latency", str(dmemLatency),
+                                "--dmem-delta-every", str(deltaEvery)] + mode,
+                               check=True, stdout=subprocess.DEVNULL)
+                outDirs.append(outDir)
+            differing = sameFiles(outDirs[0], outDirs[1], ["RFResult.txt", "StateResult_SS.txt", "SS_DMEMResult.txt",
+                                                           "SS_DMEMDelta.txt"])
+            assert differing is None, (program, imemLatency, dmemLatency, differing)
+
+    for n, program in enumerate(SAMPLES + generatedPrograms(workDir)):
+        for imemLatency, dmemLatency, kwargs in ((1, 1, {}), (3, 4, {}), (2, 5, {"issueWidth": 4, "cdbWidth": 1,
+                                                                              "fuLatency": {"alu": 3, "mem": 6}})):
+            outDirs = []
+            for eventDriven in (False, True):
+                outDir = os.path.join(workDir, "ooo%d_%d%d%d%s" % (n, imemLatency, dmemLatency, len(kwargs), eventDriven))
+                os.makedirs(outDir)
+                imem = InsMem("Imem", outDir, program)
+                dmem = DataMem("OoO", outDir, program)
+                imem.latency, dmem.latency = imemLatency, dmemLatency
+                core = OutOfOrderCore(outDir, imem, dmem, **kwargs)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if eventDriven:
+                        EventScheduler([core]).run()
+                    else:
+                        while not core.halted:
+                            core.step()
+                dmem.outputDataMem()
+                outDirs.append(outDir)
+            differing = sameFiles(outDirs[0], outDirs[1], ["RFResult.txt", "StateResult_OoO.txt", "OoO_DMEMResult.txt"])
+            assert differing is None, (program, imemLatency, dmemLatency, kwargs, differing)
+
+
+def snapshot(core):
+    return (core.cycle, core.instructionCount, core.halted, list(core.myRF.Registers), list(core.ext_dmem.DMem))
+
+
+def test_reverse_round_trip():
+    # After stepBack, replay or runBackToWrite the core must equal a fresh run at the same cycle
+    workDir = tempfile.mkdtemp()
+    rng = random.Random(0)
+    cases = [(SingleStageCore, p) for p in SAMPLES + generatedPrograms(workDir, straightLine=True)]
+    cases += [(OutOfOrderCore, p) for p in SAMPLES + generatedPrograms(workDir)]
+    for coreClass, program in cases:
+        for capacity, snapshotInterval, maxSnapshots in ((1 << 16, 16, 64), (40, 8, 4)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                fresh = coreClass(workDir, InsMem("Imem", workDir, program), DataMem("Fresh", workDir, program))
+                fresh.traceEnabled = False
+                history = []
+                while not fresh.halted:
+                    history.append(snapshot(fresh))
+                    fresh.step()
+                history.append(snapshot(fresh))
+
+                core = coreClass(workDir, InsMem("Imem", workDir, program), DataMem("Rev", workDir, program))
+                core.traceEnabled = False
+                rv = ReverseExecution(core, capacity, snapshotInterval, maxSnapshots)
+                rv.run()
+                for _ in range(20):
+                    back = rng.randrange(1, 12)
+                    if core.cycle - back < rv.earliestCycle():
+                        continue
+                    rv.stepBack(back)
+                    assert snapshot(core) == history[core.cycle], (coreClass.__name__, program, "stepBack")
+                    for _ in range(rng.randrange(0, 6)):
+                        if not core.halted:
+                            rv.step()
+                    assert snapshot(core) == history[core.cycle], (coreClass.__name__, program, "replay")
+                for reg in range(1, 32):
+                    entry = rv.runBackToWrite(register=reg)
+                    if entry is not None:
+                        assert snapshot(core) == history[entry.cycle], (coreClass.__name__, program, "runBackToWrite")
+
+
+if __name__ == "__main__":
+    test_event_driven_matches_ticking()
+    print("Event-driven and per-cycle runs match")
+    test_reverse_round_trip()
+    print("Reverse execution matches fresh runs")
@@ -0,0 +1,354 @@
+import os
+import copy
+import argparse
+
+from NYU_RV32I_6913 import InsMem, DataMem, Core, RetireRecord, Decoded, HALT_INSTR
+
+MASK32 = 0xFFFFFFFF
+
+# Decoding and ALU below are this core's own, written independently of decodeInstr and the
+# reference model's ALU_OPS, so that co-simulation checks them as well as the scheduling
+OPCODE_KIND = {"0110011": "R", "0010011": "I", "0000011": "load", "0100011": "store", "1100011": "branch",
+               "1101111": "jal"}
+R_NAMES = {("0000000", "000"): "add", ("0100000", "000"): "sub", ("0000000", "100"): "xor",
+           ("0000000", "110"): "or", ("0000000", "111"): "and"}
+I_NAMES = {"000": "addi", "100": "xori", "110": "ori", "111": "andi"}
+BRANCH_NAMES = {"000": "beq", "001": "bne"}
+
+FU_CLASS = dict([(op, "alu") for op in list(R_NAMES.values()) + list(I_NAMES.values())] +
+                [("beq", "branch"), ("bne", "branch"), ("lw", "mem"), ("sw", "mem")])
+
+
+def signed(bits):
+    return int(bits, 2) - (1 << len(bits)) if bits[0] == "1" else int(bits, 2)
+
+
+def decode(instr):
+    # Field extraction on the bit string, most significant bit first (b[0] is bit 31)
+    if instr == HALT_INSTR:
+        return Decoded("halt", 0, 0, 0, 0)
+    b = format(instr, '032b')
+    funct7, funct3, opcode = b[0:7], b[17:20], b[25:32]
+    rs2, rs1, rd = int(b[7:12], 2), int(b[12:17], 2), int(b[20:25], 2)
+    kind = OPCODE_KIND.get(opcode)
+    if kind == "R":
+        return Decoded(R_NAMES.get((funct7, funct3)), rd, rs1, rs2, 0)
+    elif kind == "I":
+        return Decoded(I_NAMES.get(funct3), rd, rs1, 0, signed(b[0:12]))
+    elif kind == "load":
+        return Decoded("lw", rd, rs1, 0, signed(b[0:12]))
+    elif kind == "store":
+        return Decoded("sw", 0, rs1, rs2, signed(b[0:7] + b[20:25]))
+    elif kind == "branch":
+        return Decoded(BRANCH_NAMES.get(funct3), 0, rs1, rs2, signed(b[0] + b[24] + b[1:7] + b[20:24] + "0"))
+    elif kind == "jal":
+        return Decoded("jal", rd, 0, 0, signed(b[0] + b[12:20] + b[11] + b[1:11] + "0"))
+    return Decoded(None, rd, rs1, rs2, 0)
+
+
+def alu(op, a, b):
+    if op == "add" or op == "addi":
+        result = a + b
+    elif op == "sub":
+        result = a - b
+    elif op == "xor" or op == "xori":
+        result = a ^ b
+    elif op == "or" or op == "ori":
+        result = a | b
+    else:
+        result = a & b
+    return result & MASK32
+
+
+class RobEntry(object):
+    # One in-flight instruction: its reorder buffer slot and, until it starts executing,
+    # its reservation station operands (vj/vk values or qj/qk producing entries)
+    __slots__ = ("seq", "pc", "instr", "d", "fu", "qj", "qk", "vj", "vk", "executing", "finishCycle",
+                 "done", "value", "address", "memRead", "nextPC")
+
+    def __init__(self, seq, pc, instr, d):
+        self.seq, self.pc, self.instr, self.d = seq, pc, instr, d
+        self.fu = FU_CLASS.get(d.op)
+        self.qj = self.qk = None
+        self.vj = self.vk = 0
+        self.executing = self.done = False
+        self.finishCycle = None
+        self.value = self.address = self.memRead = self.nextPC = None
+
+
+class OutOfOrderCore(Core):
+    # Tomasulo timing model with a reorder buffer. Each cycle, in this order: commit up to
+    # commitWidth finished instructions from the ROB head, broadcast up to cdbWidth results,
+    # start ready reservation-station entries on free functional units (oldest first), and
+    # fetch/dispatch up to issueWidth instructions. Branches stall dispatch until they resolve;
+    # JAL redirects fetch at dispatch. Stores write memory at commit, where a slow write (a cache
+    # miss or upgrade, or dmem latency above one) holds up further commits; a load starts only
+    # once every older store has its address and none of them overlaps the load.
+    def __init__(self, ioDir, imem, dmem, issueWidth=2, commitWidth=None, cdbWidth=None, robSize=32,
+                 rsSize=None, fuCount=None, fuLatency=None):
+        super(OutOfOrderCore, self).__init__(ioDir, imem, dmem)
+        self.opFilePath = os.path.join(ioDir, "StateResult_OoO.txt")
+        self.issueWidth = issueWidth
+        self.commitWidth = commitWidth or issueWidth
+        self.cdbWidth = cdbWidth or issueWidth
+        self.robSize = robSize
+        self.rsSize = dict({"alu": 8, "branch": 4, "mem": 8}, **(rsSize or {}))
+        self.fuCount = dict({"alu": 2, "branch": 1, "mem": 1}, **(fuCount or {}))
+        self.fuLatency = dict({"alu": 1, "branch": 1, "mem": 1}, **(fuLatency or {}))
+
+        self.rob = []
+        self.rs = {"alu": [], "branch": [], "mem": []}
+        self.fuBusy = {"alu": 0, "branch": 0, "mem": 0}
+        self.executing = []
+        self.regTag = [None] * 32
+        self.seq = 0
+        self.fetchBlocked = None  # unresolved branch holding up dispatch
+        self.fetchReadyCycle = 0
+        self.commitReadyCycle = 0
+        self.stats = {"robFull": 0, "rsFull": 0, "branchStall": 0, "cdbConflict": 0, "loadWait": 0}
+
+    def saveState(self):
+        return (super(OutOfOrderCore, self).saveState(),
+                copy.deepcopy((self.rob, self.rs, self.fuBusy, self.executing, self.regTag, self.fetchBlocked)),
+                self.seq, self.fetchReadyCycle, self.commitReadyCycle, dict(self.stats))
+
+    def restoreState(self, saved):
+        base, structures, self.seq, self.fetchReadyCycle, self.commitReadyCycle, stats = saved
+        super(OutOfOrderCore, self).restoreState(base)
+        self.rob, self.rs, self.fuBusy, self.executing, self.regTag, self.fetchBlocked = copy.deepcopy(structures)
+        self.stats = dict(stats)
+
+    def commit(self):
+        if self.cycle < self.commitReadyCycle:
+            return
+        for _ in range(self.commitWidth):
+            if not self.rob or not self.rob[0].done:
+                return
+            e = self.rob.pop(0)
+            d = e.d
+            self.instructionCount += 1
+            if d.op == "halt":
+                self.halted = True
+                self.notifyRetire(RetireRecord(self.cycle, e.pc, e.instr, d.op, None, None, None, None))
+                return
+
+            rd = rdValue = memWrite = None
+            if d.op == "sw":
+                self.ext_dmem.writeDataMem(e.address, e.vk)
+                memWrite = (e.address, e.vk)
+            elif e.value is not None and d.rd != 0:
+                rd, rdValue = d.rd, e.value
+                self.myRF.writeRF(rd, rdValue)
+                if self.regTag[rd] is e:
+                    self.regTag[rd] = None
+            if self.retireListeners:
+                self.notifyRetire(RetireRecord(self.cycle, e.pc, e.instr, d.op, rd, rdValue, e.memRead, memWrite))
+            if memWrite and self.ext_dmem.latency > 1:
+                # latency is read after the write, so a cache charges this store's own hit or miss
+                self.commitReadyCycle = self.cycle + self.ext_dmem.latency
+                return
+
+    def writeback(self):
+        finished = [e for e in self.executing if e.finishCycle <= self.cycle]
+        if len(finished) > self.cdbWidth:
+            self.stats["cdbConflict"] += len(finished) - self.cdbWidth
+            finished.sort(key=lambda e: e.seq)
+            finished = finished[:self.cdbWidth]
+        for e in finished:
+            self.executing.remove(e)
+            self.fuBusy[e.fu] -= 1
+            e.done = True
+            for waiting in self.rs.values():
+                for w in waiting:
+                    if w.qj is e:
+                        w.qj, w.vj = None, e.value
+                    if w.qk is e:
+                        w.qk, w.vk = None, e.value
+            if e is self.fetchBlocked:
+                self.fetchBlocked = None
+                self.state.IF["PC"] = e.nextPC
+
+    def loadMayStart(self, e):
+        for older in self.rob:
+            if older is e:
+                return True
+            if older.d.op == "sw":
+                if older.qj is not None or older.address is None:
+                    return False
+                if older.address // 4 == e.address // 4:
+                    return False
+        return True
+
+    def execute(self):
+        for fu, waiting in self.rs.items():
+            for e in list(waiting):
+                if self.fuBusy[fu] >= self.fuCount[fu]:
+                    break
+                if e.qj is not None or e.qk is not None:
+                    continue
+                d = e.d
+                latency = self.fuLatency[fu]
+                if fu == "alu":
+                    e.value = alu(d.op, e.vj, d.imm & MASK32 if d.op.endswith("i") else e.vk)
+                elif fu == "branch":
+                    taken = (e.vj == e.vk) == (d.op == "beq")
+                    e.nextPC = e.pc + d.imm if taken else e.pc + 4
+                else:
+                    e.address = (e.vj + d.imm) & MASK32
+                    if d.op == "lw":
+                        if not self.loadMayStart(e):
+                            self.stats["loadWait"] += 1
+                            continue
+                        e.value = int(self.ext_dmem.readInstr(e.address), 16)
+                        e.memRead = (e.address, e.value)
+                        # read after the access: a cache in front of memory reports hit or miss latency
+                        latency += self.ext_dmem.latency - 1
+                waiting.remove(e)
+                e.executing = True
+                e.finishCycle = self.cycle + latency
+                self.fuBusy[fu] += 1
+                self.executing.append(e)
+
+    def operand(self, reg):
+        # Value from the RF, from a finished ROB entry, or the in-flight producer to wait for
+        producer = self.regTag[reg]
+        if producer is None:
+            return self.myRF.readRF(reg) & MASK32, None
+        if producer.done:
+            return producer.value, None
+        return 0, producer
+
+    def dispatch(self):
+        if self.state.IF["nop"] or self.cycle < self.fetchReadyCycle:
+            return
+        fetched = 0
+        for _ in range(self.issueWidth):
+            if self.fetchBlocked is not None:
+                self.stats["branchStall"] += 1
+                break
+            if len(self.rob) >= self.robSize:
+                self.stats["robFull"] += 1
+                break
+            pc = self.state.IF["PC"]
+            word = self.ext_imem.readInstr(pc)
+            if word is None:
+                self.state.IF["nop"] = True
+                break
+            instr = int(word, 16)
+            d = decode(instr)
+            e = RobEntry(self.seq, pc, instr, d)
+            if e.fu is not None and len(self.rs[e.fu]) >= self.rsSize[e.fu]:
+                self.stats["rsFull"] += 1
+                break
+            if e.fu is None and d.op not in ("jal", "halt"):
+                raise ValueError("Unsupported instruction " + hex(instr) + " at PC " + str(pc))
+
+            self.seq += 1
+            fetched += 1
+            self.rob.append(e)
+            e.vj, e.qj = self.operand(d.rs1)
+            e.vk, e.qk = self.operand(d.rs2)
+            nextPC = pc + 4
+            if d.op == "jal":
+                e.value, e.done = (pc + 4) & MASK32, True
+                nextPC = pc + d.imm
+            elif d.op == "halt":
+                e.done = True
+                self.state.IF["nop"] = True
+            else:
+                self.rs[e.fu].append(e)
+                if e.fu == "branch":
+                    self.fetchBlocked = e
+            if e.d.rd != 0 and d.op not in ("sw", "beq", "bne", "halt"):
+                self.regTag[d.rd] = e
+            self.state.IF["PC"] = nextPC
+            if self.state.IF["nop"]:
+                break
+        if fetched:
+            # a fetch group that ends early (stall, full ROB/RS, HALT) still pays the fetch latency
+            self.fetchReadyCycle = self.cycle + self.ext_imem.latency
+
+    def nextEventCycle(self):
+        # While nothing can commit, finish, start or dispatch, the core only waits for the next
+        # FU completion, fetch or store write; any other state is treated as busy this cycle
+        cycle = self.cycle
+        if self.rob and self.rob[0].done and cycle >= self.commitReadyCycle:
+            return cycle
+        if self.state.IF["nop"] and not self.rob:
+            return cycle
+        for fu, waiting in self.rs.items():
+            if self.fuBusy[fu] < self.fuCount[fu] and any(e.qj is None and e.qk is None for e in waiting):
+                return cycle
+        if not (self.state.IF["nop"] or cycle < self.fetchReadyCycle or self.fetchBlocked is not None
+                or len(self.rob) >= self.robSize):
+            return cycle
+        events = [e.finishCycle for e in self.executing]
+        if not self.state.IF["nop"] and self.fetchReadyCycle > cycle:
+            events.append(self.fetchReadyCycle)
+        if self.rob and self.rob[0].done:
+            events.append(self.commitReadyCycle)
+        return max(cycle, min(events)) if events else cycle
+
+    def skipCycles(self, n):
+        # Same trace and counters as n calls to step() in which dispatch finds fetch blocked
+        if not self.state.IF["nop"] and self.cycle >= self.fetchReadyCycle:
+            self.stats["branchStall" if self.fetchBlocked is not None else "robFull"] += n
+        if self.traceEnabled:
+            self.myRF.outputRF(self.cycle, n)
+            self.printState(self.state, self.cycle, n)
+        self.cycle += n
+
+    def step(self):
+        self.commit()
+        if not self.halted:
+            self.writeback()
+            self.execute()
+            self.dispatch()
+            if self.state.IF["nop"] and not self.rob:
+                self.halted = True  # ran off the end of the program without a HALT
+
+        if self.halted:
+            self.report_performance_metrics()
+
+        if self.traceEnabled:
+            self.myRF.outputRF(self.cycle)
+            self.printState(self.state, self.cycle)
+        self.cycle += 1
+
+    def printState(self, state, cycle, repeat=1):
+        printstate = []
+        for c in range(cycle, cycle + repeat):
+            printstate.extend(["-"*70 + "\n", "State after executing cycle: " + str(c) + "\n"])
+            printstate.append("IF.PC: " + str(state.IF["PC"]) + "\n")
+            printstate.append("IF.nop: " + str(state.IF["nop"]) + "\n")
+            printstate.append("ROB.size: " + str(len(self.rob)) + "\n")
+
+        perm = "w" if cycle == 0 else "a"
+        with open(self.opFilePath, perm) as wf:
+            wf.writelines(printstate)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='RV32I out-of-order (Tomasulo) timing model')
+    parser.add_argument('--iodir', default="", type=str, help='Directory containing the input files.')
+    parser.add_argument('--inputdir', default=None, type=str, help='Directory with imem.txt/dmem.txt.')
+    parser.add_argument('--issue-width', default=2, type=int, help='Instructions fetched and dispatched per cycle.')
+    parser.add_argument('--rob-size', default=32, type=int, help='Reorder buffer entries.')
+    parser.add_argument('--alu-units', default=2, type=int, help='Number of ALU functional units.')
+    parser.add_argument('--mem-latency', default=1, type=int, help='Cycles per load/store unit operation.')
+    args = parser.parse_args()
+
+    ioDir = os.path.abspath(args.iodir)
+    print("IO Directory:", ioDir)
+
+    imem = InsMem("Imem", ioDir, args.inputdir)
+    dmem_ooo = DataMem("OoO", ioDir, args.inputdir)
+    oooCore = OutOfOrderCore(ioDir, imem, dmem_ooo, issueWidth=args.issue_width, robSize=args.rob_size,
+                             fuCount={"alu": args.alu_units}, fuLatency={"mem": args.mem_latency})
+    oooCore.myRF.outputFile = os.path.join(ioDir, "OoO_RFResult.txt")
+
+    while not oooCore.halted:
+        oooCore.step()
+
+    dmem_ooo.outputDataMem()
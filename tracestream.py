@@ -0,0 +1,184 @@
+import os
+import queue
+import argparse
+import traceback
+import multiprocessing
+from collections import Counter
+
+from NYU_RV32I_6913 import InsMem, DataMem, SingleStageCore
+
+# A consumer is any callable taking an iterable of RetireRecords; its return value is the result
+# of the pipeline. Filters are generator functions, so stages compose without building lists:
+#
+#   writer = TraceWriter("trace.txt")
+#   writer(filterRecords(retired(core), ops=("lw", "sw")))
+
+
+def retired(core, maxCycles=None):
+    # Drive the core and yield each RetireRecord as it retires
+    pending = []
+    core.retireListeners.append(pending.append)
+    try:
+        while not core.halted and (maxCycles is None or core.cycle < maxCycles):
+            core.step()
+            if pending:
+                for record in pending:
+                    yield record
+                del pending[:]
+    finally:
+        core.retireListeners.remove(pending.append)
+
+
+def filterRecords(records, predicate=None, ops=None, pcRange=None):
+    # pcRange is a [start, end) pair of byte addresses
+    for record in records:
+        if ops is not None and record.op not in ops:
+            continue
+        if pcRange is not None and not pcRange[0] <= record.pc < pcRange[1]:
+            continue
+        if predicate is not None and not predicate(record):
+            continue
+        yield record
+
+
+class TraceWriter(object):
+    # One line per retired instruction: cycle, PC, raw word, op, register write, memory accesses
+    def __init__(self, path, bufferLines=4096):
+        self.path = path
+        self.bufferLines = bufferLines
+
+    def formatRecord(self, r):
+        line = f"{r.cycle}\t{r.pc}\t{r.instr:08x}\t{r.op}"
+        line += f"\tx{r.rd}={r.rdValue:08x}" if r.rd is not None else "\t-"
+        line += f"\tR[{r.memRead[0]}]={r.memRead[1] & 0xFFFFFFFF:08x}" if r.memRead else "\t-"
+        line += f"\tW[{r.memWrite[0]}]={r.memWrite[1] & 0xFFFFFFFF:08x}" if r.memWrite else "\t-"
+        return line + "\n"
+
+    def __call__(self, records):
+        count = 0
+        lines = []
+        with open(self.path, "w") as f:
+            f.write("cycle\tpc\tinstr\top\trd\tload\tstore\n")
+            for record in records:
+                lines.append(self.formatRecord(record))
+                if len(lines) >= self.bufferLines:
+                    f.writelines(lines)
+                    count += len(lines)
+                    lines = []
+            f.writelines(lines)
+        return count + len(lines)
+
+
+class Aggregator(object):
+    # Instruction mix, per-PC execution counts and register/memory traffic of a record stream
+    def __call__(self, records):
+        ops, pcs, regWrites = Counter(), Counter(), Counter()
+        loads = stores = 0
+        for record in records:
+            ops[record.op] += 1
+            pcs[record.pc] += 1
+            if record.rd is not None:
+                regWrites[record.rd] += 1
+            if record.memRead:
+                loads += 1
+            if record.memWrite:
+                stores += 1
+        return {"instructions": sum(ops.values()), "ops": dict(ops), "pcs": dict(pcs),
+                "regWrites": dict(regWrites), "loads": loads, "stores": stores}
+
+
+def drainQueue(batches):
+    while True:
+        batch = batches.get()
+        if batch is None:
+            return
+        for record in batch:
+            yield record
+
+
+def consumerProcess(consumer, records, results):
+    # Tracebacks are sent back as text, since the exception itself may not pickle
+    try:
+        result = (True, consumer(drainQueue(records)))
+    except Exception:
+        result = (False, traceback.format_exc())
+    results.put(result)
+
+
+def runInProcess(records, consumer, maxBatches=64, batchSize=256, poll=0.1):
+    # Run the consumer in a separate process. Records cross a bounded queue in batches; when the
+    # consumer falls behind, put() blocks and the simulation waits instead of buffering without bound.
+    # If the consumer raises or its process dies, the error is raised here; if it returns without
+    # reading everything, the remaining records are dropped and its result is returned.
+    batches = multiprocessing.Queue(maxBatches)
+    results = multiprocessing.Queue(1)
+    worker = multiprocessing.Process(target=consumerProcess, args=(consumer, batches, results))
+    worker.start()
+    outcome = None
+
+    def send(batch):
+        while True:
+            try:
+                batches.put(batch, timeout=poll)
+                return True
+            except queue.Full:
+                if not results.empty() or not worker.is_alive():
+                    return False
+
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batchSize:
+                if not send(batch):
+                    break
+                batch = []
+        else:
+            if not batch or send(batch):
+                send(None)
+
+        while outcome is None:
+            try:
+                outcome = results.get(timeout=poll)
+            except queue.Empty:
+                if not worker.is_alive():
+                    try:
+                        outcome = results.get(timeout=poll)  # it may have finished just now
+                    except queue.Empty:
+                        raise RuntimeError("Trace consumer process exited with code " + str(worker.exitcode))
+    finally:
+        if outcome is None or not outcome[0]:
+            worker.terminate()
+        batches.cancel_join_thread()  # batches the consumer never read must not block our exit
+        worker.join()
+
+    ok, result = outcome
+    if not ok:
+        raise RuntimeError("Trace consumer failed:\n" + result)
+    return result
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Export the retired-instruction stream of the single stage core')
+    parser.add_argument('--iodir', default="", type=str, help='Directory containing the input files.')
+    parser.add_argument('--inputdir', default=None, type=str, help='Directory with imem.txt/dmem.txt.')
+    parser.add_argument('--out', default="RetireTrace.txt", type=str, help='Trace file, relative to iodir.')
+    parser.add_argument('--ops', default=None, type=str, help='Comma-separated mnemonics to keep, e.g. lw,sw.')
+    parser.add_argument('--separate-process', action='store_true', help='Write the trace from a separate process.')
+    args = parser.parse_args()
+
+    ioDir = os.path.abspath(args.iodir)
+    print("IO Directory:", ioDir)
+
+    imem = InsMem("Imem", ioDir, args.inputdir)
+    dmem_ss = DataMem("SS", ioDir, args.inputdir)
+    ssCore = SingleStageCore(ioDir, imem, dmem_ss)
+    ssCore.traceEnabled = False
+
+    records = retired(ssCore)
+    if args.ops:
+        records = filterRecords(records, ops=args.ops.split(","))
+    writer = TraceWriter(os.path.join(ioDir, args.out))
+    count = runInProcess(records, writer) if args.separate_process else writer(records)
+    print("Wrote " + str(count) + " retired instructions to " + writer.path)